@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import hashlib
+import os
+
+from fastapi import FastAPI
+
+# Stand-in for the solved.ac API with deterministic answers, so benchmarks
+# neither depend on nor hammer the real service. Runs in-process (through
+# httpx.ASGITransport) or as its own server:
+#
+#   python -m bench.fakes --port 8900
+#   SOLVEDAC_BASE_URL=http://127.0.0.1:8900 uvicorn main:app
+#
+# The LLM has its own offline backend: LLM_BACKEND=stub (see src/llm.py).
+
+TAGS = ["dp", "greedy", "graphs", "implementation", "math", "string", "bfs", "dfs", "bruteforcing", "sorting"]
+
+LATENCY = float(os.environ.get("FAKE_SOLVEDAC_LATENCY", 0.05))
+SOLVED_PER_USER = int(os.environ.get("FAKE_SOLVEDAC_SOLVED", 120))
+PAGE_SIZE = 50
+
+app = FastAPI()
+
+
+def _number(text: str, modulo: int) -> int:
+    return int(hashlib.md5(text.encode()).hexdigest()[:8], 16) % modulo
+
+
+def problem_item(problem_id: int) -> dict:
+    return {
+        "problemId": problem_id,
+        "titleKo": f"문제 {problem_id}",
+        "level": problem_id % 30 + 1,
+        "tags": [{"key": TAGS[problem_id % len(TAGS)]}],
+        "acceptedUserCount": _number(str(problem_id), 10000),
+    }
+
+
+def user_profile(handle: str) -> dict:
+    return {
+        "handle": handle,
+        "bio": "",
+        "profileImageUrl": None,
+        "solvedCount": _number(handle, 2000),
+        "tier": _number(handle, 30) + 1,
+        "rating": _number(handle, 3000),
+        "rank": _number(handle, 100000) + 1,
+        "class": _number(handle, 10),
+        "maxStreak": _number(handle, 365),
+    }
+
+
+@app.get("/user/show")
+async def user_show(handle: str):
+    await asyncio.sleep(LATENCY)
+    return user_profile(handle)
+
+
+@app.get("/user/top_100")
+async def user_top_100(handle: str):
+    await asyncio.sleep(LATENCY)
+    start = _number(handle, 20000) + 1000
+    return {"count": 100, "items": [problem_item(start + i) for i in range(100)]}
+
+
+@app.get("/problem/show")
+async def problem_show(problemId: int):
+    await asyncio.sleep(LATENCY)
+    return problem_item(problemId)
+
+
+@app.get("/search/problem")
+async def search_problem(query: str, page: int = 1):
+    await asyncio.sleep(LATENCY)
+    if query.startswith("s@"):
+        # A user's solved problems
+        start, count = _number(query[2:], 20000) + 1000, SOLVED_PER_USER
+    else:
+        # Catalog queries ("tier:b5..s1 tag:dp") all get the same catalog
+        start, count = 1000, 2000
+    first = (page - 1) * PAGE_SIZE
+    ids = range(start + first, start + min(first + PAGE_SIZE, count))
+    return {"count": count, "items": [problem_item(problem_id) for problem_id in ids]}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake solved.ac API for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
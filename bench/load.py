@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import date as date_type, datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench import fakes
+
+# Async load generator. Each scenario hits one endpoint with `concurrency`
+# workers for `duration` seconds (after an unrecorded warm-up) and reports
+# requests per second and latency percentiles; the whole run is saved as JSON.
+#
+# Against a running server (seed it first with bench.seed, same sizes):
+#   python -m bench.load --url http://127.0.0.1:8000 --users 1000 --groups 50
+#
+# In-process, against a local mongod or the mongomock stand-in, with the fake
+# solved.ac and the stub LLM backend:
+#   python -m bench.load --mongo mongodb://localhost:27017 --seed
+#   python -m bench.load --mongo mongomock --seed --scenarios login,start,stop
+#
+# (the mongomock stand-in comes from `pip install -r requirements-dev.txt`)
+#
+# In-process numbers include the load generator's own CPU time, since both
+# share one event loop; use --url for absolute figures and in-process runs
+# for before/after comparisons.
+
+RESULTS_DIR = Path(__file__).parent / "results"
+PASSWORD = "benchpass"  # bench.seed.PASSWORD
+
+
+class Params:
+    def __init__(self, users: int, groups: int, today: str):
+        self.users = users
+        self.groups = groups
+        self.today = today
+
+    def user(self, rng: random.Random) -> str:
+        return f"user{rng.randrange(self.users)}"
+
+    def group(self, rng: random.Random) -> str:
+        return f"group{rng.randrange(self.groups)}"
+
+
+Request = Tuple[str, str, Optional[dict]]
+
+SCENARIOS: Dict[str, Callable[[random.Random, Params], Request]] = {
+    "login": lambda rng, p: ("POST", "/login", {"id": p.user(rng), "password": PASSWORD}),
+    "start": lambda rng, p: ("POST", "/start", {"id": p.user(rng), "date": p.today}),
+    "stop": lambda rng, p: ("POST", "/stop", {"id": p.user(rng), "date": p.today, "duration": rng.randrange(4 * 3600)}),
+    "timer_group": lambda rng, p: ("POST", "/timer/group", {"group_name": p.group(rng), "date": p.today}),
+    "group_member": lambda rng, p: ("POST", "/group/member", {"group_name": p.group(rng)}),
+    "rank_day": lambda rng, p: ("POST", "/rank/individual_day", {"group_name": p.group(rng), "date": p.today}),
+    "rank_month": lambda rng, p: ("POST", "/rank/individual_month", {"group_name": p.group(rng), "date": p.today[:7]}),
+    "rank_page": lambda rng, p: ("POST", "/rank/leaderboard", {"group_name": "default", "key": p.today, "offset": rng.randrange(p.users), "limit": 20}),
+    "recommend_list": lambda rng, p: (
+        "POST", "/recommend/list", {"tier": rng.randrange(4, 27), "keys": rng.sample(fakes.TAGS, 2), "id": p.user(rng)}
+    ),
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    make_request: Callable[[random.Random, Params], Request],
+    params: Params,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    random_seed: int,
+) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    statuses: Dict[int, int] = {}
+    recording = False
+    deadline = 0.0
+
+    async def worker(n: int):
+        nonlocal errors
+        rng = random.Random(random_seed * 1000 + n)
+        while time.perf_counter() < deadline:
+            method, path, body = make_request(rng, params)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            if recording:
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+                if not 200 <= status < 400:
+                    errors += 1
+
+    if warmup > 0:
+        deadline = time.perf_counter() + warmup
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    recording = True
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    result = summarize(latencies, errors, time.perf_counter() - started)
+    result["status_codes"] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+
+@asynccontextmanager
+async def in_process_transport(args):
+    # Configure the app for local stand-ins before anything imports src.config
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    if args.mongo == "mongomock":
+        # No explain() or $lookup with let/pipeline in mongomock, so index
+        # checks are skipped and /timer/group reports errors there
+        os.environ["SCHEMA_ENSURE_INDEXES"] = ""
+    else:
+        os.environ["CLIENT"] = args.mongo
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    import main
+    from bench.seed import seed
+    from src.db import Database
+    from src.solvedac import SolvedAcClient
+
+    if args.mongo == "mongomock":
+        from mongomock_motor import AsyncMongoMockClient
+
+        main.connect = lambda uri=None: Database(AsyncMongoMockClient(), name=args.db)
+
+    async with main.app.router.lifespan_context(main.app):
+        state = main.app.state
+        await state.solvedac.aclose()
+        state.solvedac = SolvedAcClient(base_url="http://solvedac", transport=httpx.ASGITransport(app=fakes.app))
+        if args.seed:
+            counts = await seed(
+                state.db, args.users, args.groups, args.group_size, args.days, args.problems, args.today, reset=True
+            )
+            print(f"seeded {counts}")
+            await state.problem_index.load(state.db)
+        # Errors become 500 responses (counted) instead of exceptions
+        yield httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+
+
+def print_report(results: Dict[str, dict], baseline: Optional[dict]):
+    header = f"{'scenario':<16}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        line = (
+            f"{name:<16}{result['rps']:>10.1f}{result['p50_ms']:>10.2f}"
+            f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>8}"
+        )
+        before = (baseline or {}).get("scenarios", {}).get(name)
+        if before and before["rps"]:
+            line += f"   rps {100 * (result['rps'] / before['rps'] - 1):+.1f}%"
+            if before["p95_ms"]:
+                line += f"  p95 {100 * (result['p95_ms'] / before['p95_ms'] - 1):+.1f}%"
+        print(line)
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Load-test the API")
+    parser.add_argument("--url", help="base URL of a running server; in-process when omitted")
+    parser.add_argument("--mongo", default="mongodb://localhost:27017", help="in-process only; 'mongomock' for the in-memory stand-in")
+    parser.add_argument("--db", default="bench")
+    parser.add_argument("--seed", action="store_true", help="in-process only: reset and seed the database first")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--group-size", type=int, default=20)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--problems", type=int, default=5000)
+    parser.add_argument("--today", default=date_type.today().isoformat(), help="date the seeded history ends on")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--out", help="results file (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to print the change against")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    params = Params(args.users, args.groups, args.today)
+
+    if args.url:
+        transport_context = None
+        client = httpx.AsyncClient(base_url=args.url, timeout=30, limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        transport_context = in_process_transport(args)
+        client = httpx.AsyncClient(transport=await transport_context.__aenter__(), base_url="http://bench", timeout=30)
+
+    results = {}
+    try:
+        for name in names:
+            print(f"running {name} ({args.concurrency} workers, {args.duration}s)...", flush=True)
+            results[name] = await run_scenario(
+                client, SCENARIOS[name], params, args.concurrency, args.duration, args.warmup, args.random_seed
+            )
+    finally:
+        await client.aclose()
+        if transport_context is not None:
+            await transport_context.__aexit__(None, None, None)
+
+    report = {
+        "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "target": args.url or f"in-process ({args.mongo})",
+        "python": platform.python_version(),
+        "config": {
+            key: getattr(args, key)
+            for key in ("concurrency", "duration", "warmup", "users", "groups", "group_size", "days", "problems", "today")
+        },
+        "scenarios": results,
+    }
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(results, baseline)
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"saved {out}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import random
+from collections import defaultdict
+from datetime import date as date_type, datetime, timedelta
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from bench import fakes
+from src import ingest, rollup, schema, security, timer_store
+from src.db import Database
+
+BATCH_SIZE = 1000
+PASSWORD = "benchpass"
+COLLECTIONS = ["User", "Info", "Group", "Timer", "TimerBucket", "StudyRollup", "Problems", "Tip", "PresenceEvent", "SolvedProblems"]
+
+
+def user_id(i: int) -> str:
+    return f"user{i}"
+
+
+def group_name(i: int) -> str:
+    return f"group{i}"
+
+
+async def _insert(collection, docs: List[dict]):
+    for start in range(0, len(docs), BATCH_SIZE):
+        await collection.insert_many(docs[start:start + BATCH_SIZE], ordered=False)
+
+
+async def seed(
+    db: Database,
+    users: int = 1000,
+    groups: int = 50,
+    group_size: int = 20,
+    days: int = 60,
+    problems: int = 5000,
+    today: str = None,
+    reset: bool = False,
+    random_seed: int = 1,
+) -> Dict[str, int]:
+    # Users with solved.ac-shaped profiles, groups (plus the "default" group
+    # everyone is in, as /signup does), `days` days of timer history per user
+    # ending today with matching rollups, and a problem catalog.
+    rng = random.Random(random_seed)
+    today = today or date_type.today().isoformat()
+    if reset:
+        for name in COLLECTIONS:
+            await db.db[name].drop()
+    await schema.ensure_indexes(db)
+
+    # bcrypt is slow on purpose; every user shares one hash
+    password_hash = security.pwd_context.hash(PASSWORD)
+    now = datetime.utcnow()
+    ids = [user_id(i) for i in range(users)]
+    memberships = {group_name(g): rng.sample(ids, min(group_size, users)) for g in range(groups)}
+    memberships["default"] = ids
+    groups_of = defaultdict(list)
+    for name, members in memberships.items():
+        for member in members:
+            groups_of[member].append(name)
+
+    await _insert(db.User, [
+        {"id": u, "bj_id": f"bj_{u}", "nickname": f"User {u}", "password": password_hash} for u in ids
+    ])
+    await _insert(db.Info, [
+        {
+            **fakes.user_profile(f"bj_{u}"),
+            "id": u,
+            "bj_id": f"bj_{u}",
+            "nickname": f"User {u}",
+            "group": groups_of[u],
+            "problems": [str(1000 + rng.randrange(problems)) for _ in range(5)],
+            "todo_problems": [],
+            "profileUpdatedAt": now,
+        }
+        for u in ids
+    ])
+    await _insert(db.Group, [
+        {
+            "group_name": name,
+            "manager_id": members[0] if members else "",
+            "goal_time": 3600,
+            "goal_number": 3,
+            "tier": rng.randrange(1, 31),
+            "is_secret": False,
+            "password": "",
+            "group_bio": "",
+            "members": members,
+            "problems": [],
+        }
+        for name, members in memberships.items()
+    ])
+    await _insert(db.Timer, [
+        {"id": u, "nickname": f"User {u}", "isStudy": False, "recent": None, "total": 0, "bucketed": True} for u in ids
+    ])
+
+    # Timer history: today always exists (so /stop works), earlier days 70%
+    end = datetime.strptime(today, "%Y-%m-%d").date()
+    dates = [(end - timedelta(days=n)).isoformat() for n in range(days)]
+    buckets, rollups = [], []
+    for u in ids:
+        months = defaultdict(dict)
+        totals = defaultdict(int)
+        for day in dates:
+            if day != today and rng.random() > 0.7:
+                continue
+            duration = rng.randrange(0, 4 * 3600)
+            months[timer_store.month_of(day)][day] = duration
+            for period, key in rollup.period_keys(day).items():
+                totals[(period, key)] += duration
+        buckets.extend({"id": u, "month": month, "days": entries} for month, entries in months.items())
+        rollups.extend(
+            {"period": period, "key": key, "id": u, "duration": total} for (period, key), total in totals.items()
+        )
+    await _insert(db.TimerBucket, buckets)
+    await _insert(db.StudyRollup, rollups)
+
+    await _insert(db.Problems, [
+        {**ingest.problem_document(fakes.problem_item(1000 + i)), "updatedAt": now} for i in range(problems)
+    ])
+    return {
+        "users": users,
+        "groups": len(memberships),
+        "timer_buckets": len(buckets),
+        "rollups": len(rollups),
+        "problems": problems,
+    }
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Seed a benchmark database")
+    parser.add_argument("--mongo", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="bench")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--group-size", type=int, default=20)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--problems", type=int, default=5000)
+    parser.add_argument("--today", help="YYYY-MM-DD, defaults to today")
+    parser.add_argument("--reset", action="store_true", help="drop the benchmark collections first")
+    args = parser.parse_args()
+    db = Database(AsyncIOMotorClient(args.mongo), name=args.db)
+    try:
+        counts = await seed(
+            db, args.users, args.groups, args.group_size, args.days, args.problems, args.today, args.reset
+        )
+        print(counts)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # python -m bench.seed --mongo mongodb://localhost:27017 --db bench --reset
+    asyncio.run(_main())
@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# Cold-start cost of one worker: wall time to import the app and the
+# worker's resident memory afterwards, each measured in a fresh interpreter.
+#
+#   python -m bench.startup --runs 5
+#   python -m bench.startup --runs 5 --with-llm   # plus the first LLM client
+#
+# --with-llm also imports the LangChain/OpenAI stack the way the first
+# /recommend/tip call does, to show what the lazy import saves at startup.
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["langchain", "langchain_core", "langchain_openai", "openai", "tiktoken", "socketio"]
+
+# Runs in the child; prints one JSON line
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+llm = 0.0
+if {with_llm}:
+    started = time.perf_counter()
+    from src.llm import OpenAIBackend
+    OpenAIBackend()._chat()
+    llm = time.perf_counter() - started
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # peak, KiB on Linux
+
+print(json.dumps({{
+    "import_s": imported,
+    "llm_s": llm,
+    "rss_mb": rss_kb() / 1024,
+    "modules": len(sys.modules),
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(with_llm: bool) -> dict:
+    # The key only lets ChatOpenAI be constructed; nothing is sent
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(with_llm=with_llm, heavy=HEAVY_MODULES)],
+        cwd=ROOT,
+        env={**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench")},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure worker import time and RSS")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--with-llm", action="store_true", help="also construct the OpenAI client, as the first tip does")
+    parser.add_argument("--out", help="write the runs and summary as JSON")
+    args = parser.parse_args()
+
+    runs = [measure(args.with_llm) for _ in range(args.runs)]
+    summary = {
+        "import_s_median": statistics.median(run["import_s"] for run in runs),
+        "import_s_min": min(run["import_s"] for run in runs),
+        "llm_s_median": statistics.median(run["llm_s"] for run in runs),
+        "rss_mb_median": statistics.median(run["rss_mb"] for run in runs),
+        "modules": runs[-1]["modules"],
+        "heavy_modules_loaded": runs[-1]["heavy"],
+    }
+    print(f"import main: {summary['import_s_median'] * 1000:.0f} ms median, {summary['import_s_min'] * 1000:.0f} ms min")
+    if args.with_llm:
+        print(f"first LLM client: {summary['llm_s_median'] * 1000:.0f} ms median")
+    print(f"RSS after startup: {summary['rss_mb_median']:.1f} MB, {summary['modules']} modules")
+    print(f"heavy modules loaded: {', '.join(summary['heavy_modules_loaded']) or 'none'}")
+    if args.out:
+        Path(args.out).write_text(json.dumps({"runs": runs, "summary": summary}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
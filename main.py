@@ -1,30 +1,84 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import List
 from typing import Optional, Any, Dict
-from fastapi import Body, Depends, FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, status, websockets , APIRouter
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, status, websockets , APIRouter
 import httpx
 from pydantic import BaseModel, Field
-from pymongo import MongoClient, ReturnDocument
-from passlib.context import CryptContext
-import os
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import secrets
 from fastapi.middleware.cors import CORSMiddleware 
-from bson import ObjectId
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse
 from routers.group import group
 from routers.timer import timer
 from routers.rank import rank
 from routers.recommend import recommend
-import requests
-import socketio
-
-# sio = socketio.AsyncServer(async_mode='asgi')
-app = FastAPI()
-
-# app.mount('/timer', timer_socket_app)
-# socket_app = socketio.ASGIApp(sio)
+from src.db import Database, connect, get_db
+from src.dbstats import DBStatsMiddleware
+from src.http_metrics import MetricsMiddleware
+from src.solvedac import SolvedAcClient, SolvedAcError, get_solvedac
+from src.problem_index import ProblemIndex
+from src.solved import SolvedCache, get_solved_cache
+from src.tip_cache import TipCache
+from src.llm import LLMExecutor
+from src.leaderboard import LeaderboardStore, get_leaderboards
+from src.serialization import MongoJSONResponse
+from src.presence import PresenceRegistry, get_presence
+from src.profile import INFO_PROJECTION, ProfileRefresher, get_profiles, has_profile, is_stale, profile_refreshes
+from src.broadcast import MemoryBroadcast, create_broadcast, get_broadcast, timer_channel
+from src import config, ingest, metrics, rollup, schema, security, timer_store
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Single Motor client shared by every router in this worker
+    app.state.db = connect()
+    if config.SCHEMA_ENSURE_INDEXES:
+        # Like the index load below, an unreachable Mongo doesn't stop the
+        # worker; the next start (or python -m src.schema) builds them
+        try:
+            await schema.ensure_indexes(app.state.db)
+            await schema.verify(app.state.db)
+        except Exception:
+            logging.exception("Index bootstrap failed; starting without it")
+    app.state.solvedac = SolvedAcClient()
+    app.state.problem_index = ProblemIndex()
+    app.state.solved_cache = SolvedCache()
+    app.state.tip_cache = TipCache()
+    app.state.llm = LLMExecutor.from_config()
+    app.state.broadcast = create_broadcast(app.state.db)
+    await app.state.broadcast.start()
+    app.state.presence = PresenceRegistry()
+    app.state.leaderboards = LeaderboardStore(app.state.broadcast)
+    app.state.profiles = ProfileRefresher()
+    presence_flusher = asyncio.create_task(app.state.presence.run_flush(app.state.db))
+    leaderboard_sync = asyncio.create_task(app.state.leaderboards.run_sync())
+    try:
+        await app.state.problem_index.load(app.state.db)
+    except Exception:
+        logging.exception("Problem index load failed; retrying in the background")
+    index_refresher = asyncio.create_task(app.state.problem_index.run_refresh(app.state.db))
+    yield
+    index_refresher.cancel()
+    presence_flusher.cancel()
+    leaderboard_sync.cancel()
+    # Let a flush interrupted mid-write hand its users back before the last one
+    await asyncio.gather(index_refresher, presence_flusher, leaderboard_sync, return_exceptions=True)
+    try:
+        await app.state.presence.flush(app.state.db)
+    except Exception:
+        logging.exception("Final timer state flush failed")
+    await app.state.broadcast.stop()
+    await app.state.profiles.close()
+    await app.state.solvedac.aclose()
+    app.state.db.close()
+    security.shutdown()
 
 
-# app.mount('/',socket_app)
+app = FastAPI(lifespan=lifespan, default_response_class=MongoJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +87,9 @@ app.add_middleware(
     allow_methods=["*"], 
     allow_headers=["*"],
 )
+app.add_middleware(DBStatsMiddleware)
+# Outermost, so request timings include the other middleware
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(group)
 app.include_router(timer)
@@ -44,21 +101,16 @@ app.include_router(recommend)
 #     tags=["timer"],
 #     responses={404: {"description": "Not found"}},
 # )
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# MongoDB client initialization
+# Malformed timer dates (see timer_store.check_date) are client errors
+@app.exception_handler(timer_store.InvalidDate)
+async def invalid_date_handler(request: Request, exc: timer_store.InvalidDate):
+    return MongoJSONResponse({"detail": str(exc)}, status_code=status.HTTP_400_BAD_REQUEST)
 
-CLIENT = os.environ.get("CLIENT")
-print("Connecting to MongoDB with URI:", CLIENT)  # Add this line to debug
 
-client = MongoClient(CLIENT)
-db = client['MadCampWeek3']
-collection_User = db['User']
-collection_Info = db['Info']
-collection_Group = db['Group']
-collection_Timer = db['Timer']
-collection_Problems = db['Problems']
+@app.get('/metrics', include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Models
 class LoginModel(BaseModel):
@@ -90,61 +142,66 @@ class ExistResponseModel(BaseModel):
 class TestModel(BaseModel):
     test : str
 @app.get('/test')
-async def test_endpoint():
+async def test_endpoint(db: Database = Depends(get_db), solvedac: SolvedAcClient = Depends(get_solvedac)):
+    # Fetch the top 100 problems of the seed user through the shared client
     try:
-        # Define the URL of the external API
-        url = 'https://solved.ac/api/v3/user/top_100?handle=yongseong97'
-
-        # Make a GET request to the external API
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-
-        # Check if the response status code is 200 (OK)
-        if response.status_code == 200:
-            # Parse the JSON response
-            data = response.json()
-            
-            # Extract relevant fields from each item in the 'items' list
-            parsed_data = []
-            for item in data['items']:
-                problem_id = item['problemId']
-                title_ko = item['titleKo']
-                level = item['level']
-                key = item['tags'][0]['key'] if item['tags'] else None
-                
-                parsed_data.append({
-                    'problemId': problem_id,
-                    'titleKo': title_ko,
-                    'level': level,
-                    'key': key
-                })
-                for item in parsed_data:
-                    problem_id = item['problemId']
-            
-            # Check if a document with the same problemId exists in collection_Problems
-                existing_problem = collection_Problems.find_one({'problemId': problem_id})
-            
-                if not existing_problem:
-                # If it doesn't exist, insert the new document
-                    collection_Problems.insert_one(item)
-                else:
-                # If it already exists, update the existing document (optional)
-                # You can choose to update or skip duplicates as needed
-                # Here, we are updating the 'key' field of the existing document
-                    collection_Problems.update_one(
-                    {'problemId': problem_id},
-                    {'$set': {'key': item['key']}}
-                )
-
-            return parsed_data  # Return the parsed data as a list of dictionaries
-        else:
-            # Raise an HTTPException with the appropriate status code and error message
-            raise HTTPException(status_code=response.status_code, detail="External API request failed")
-
+        data = await solvedac.user_top_100('yongseong97')
+    except SolvedAcError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except httpx.RequestError as e:
         # Handle any network-related errors here
         raise HTTPException(status_code=500, detail="Network error occurred")
 
+    # Extract relevant fields from each item and upsert them in one bulk write
+    parsed_data = [ingest.problem_document(item) for item in data['items']]
+    await ingest.upsert_problems(db, parsed_data)
+
+    return parsed_data  # Return the parsed data as a list of dictionaries
+
+
+class IngestRequestModel(BaseModel):
+    tags: List[str] = []
+    level_min: int = Field(1, ge=1, le=30)
+    level_max: int = Field(30, ge=1, le=30)
+    restart: bool = False
+
+@app.post('/problems/ingest')
+async def ingest_problems(
+    request_data: IngestRequestModel,
+    x_admin_token: Optional[str] = Header(None),
+    db: Database = Depends(get_db),
+    solvedac: SolvedAcClient = Depends(get_solvedac),
+):
+    # A full scrape eats the solved.ac quota /signup and /login depend on:
+    # admins only, and one run at a time across all queries
+    if not config.INGEST_ADMIN_TOKEN or not secrets.compare_digest((x_admin_token or "").encode(), config.INGEST_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Ingestion requires the admin token.")
+    if ingest.any_running():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="An ingestion run is already in progress.")
+    if request_data.level_min > request_data.level_max:
+        raise HTTPException(status_code=400, detail="level_min must not be greater than level_max")
+    queries = ingest.build_queries(request_data.tags, request_data.level_min, request_data.level_max)
+    # Runs in the background; progress is visible through GET /problems/ingest
+    ingest.start_background(db, solvedac, queries, request_data.restart)
+    return {"queries": queries}
+
+@app.get('/problems/ingest')
+async def ingest_status(db: Database = Depends(get_db)):
+    checkpoints = await db.IngestCheckpoint.find({}).to_list(length=None)
+    return {
+        "checkpoints": [
+            {
+                "query": checkpoint["_id"],
+                "page": checkpoint.get("page", 0),
+                "written": checkpoint.get("written", 0),
+                "done": checkpoint.get("done", False),
+                "running": ingest.is_running(checkpoint["_id"]),
+                "updatedAt": checkpoint.get("updatedAt"),
+            }
+            for checkpoint in checkpoints
+        ]
+    }
+
 
 # @app.post('/test', response_model=ExistResponseModel)
 # async def test(str: TestModel):
@@ -152,25 +209,19 @@ async def test_endpoint():
 #     print("Connecting to MongoDB with URI:", CLIENT) 
 
 @app.post('/signup_bj_id', response_model=ExistResponseModel)
-async def check_bj_id(bj_id_data: BJIDModel):
-    response = requests.get(f'https://solved.ac/api/v3/user/show?handle={bj_id_data.bj_id}')
-    
-    # If the request to the external API is successful and user data is found
-    if response.status_code == 200:
-        # Depending on the API you're using, you may need to check the content of the response
-        # to make sure the user actually exists. For example:
-        # user_data = response.json()
-        # exist = 'id' in user_data  # or any other key that indicates user existence
+async def check_bj_id(bj_id_data: BJIDModel, solvedac: SolvedAcClient = Depends(get_solvedac)):
+    try:
+        await solvedac.user_show(bj_id_data.bj_id)
         exist = True  # Assuming a 200 OK status means the user exists
-    else:
+    except SolvedAcError:
         # If the status code is not 200, we assume the user doesn't exist
         exist = False
 
     return ExistResponseModel(exist=exist)
 
 @app.post('/signup_id', response_model=ExistModel)
-async def check_id(check_id_data: CheckIdModel):
-    exist = collection_User.find_one({"id": check_id_data.id}) is not None
+async def check_id(check_id_data: CheckIdModel, db: Database = Depends(get_db)):
+    exist = await db.User.find_one({"id": check_id_data.id}) is not None
     return ExistModel(exist=exist)
 
 
@@ -178,13 +229,18 @@ async def check_id(check_id_data: CheckIdModel):
 
 
 @app.post('/signup', response_model=SuccessModel)
-async def signup(signup_data: SignupModel):
+async def signup(
+    signup_data: SignupModel,
+    db: Database = Depends(get_db),
+    solvedac: SolvedAcClient = Depends(get_solvedac),
+    leaderboards: LeaderboardStore = Depends(get_leaderboards),
+):
     # Check if the user ID already exists
-    if collection_User.find_one({"id": signup_data.id}):
+    if await db.User.find_one({"id": signup_data.id}):
         return SuccessModel(success=False, message="ID already exists.")
 
     # Hash the password
-    hashed_password = pwd_context.hash(signup_data.password)
+    hashed_password = await security.hash_password(signup_data.password)
 
     # User data for collection_User
     user_data = {
@@ -194,8 +250,12 @@ async def signup(signup_data: SignupModel):
         "password": hashed_password
     }
 
-    # Insert user data into User collection
-    collection_User.insert_one(user_data)
+    # Insert user data into User collection; the unique index on User.id
+    # catches a concurrent signup that slipped past the check above
+    try:
+        await db.User.insert_one(user_data)
+    except DuplicateKeyError:
+        return SuccessModel(success=False, message="ID already exists.")
 
     timer_data = {
     "id": signup_data.id,
@@ -203,14 +263,16 @@ async def signup(signup_data: SignupModel):
     "isStudy" : False,
     "recent" : None,
     "total" : 0,
-    "dates": []  
+    "bucketed": True  # durations live in TimerBucket
     }
-    collection_Timer.insert_one(timer_data)
+    await db.Timer.insert_one(timer_data)
 
     # Fetch additional user information from the external API
-    response = requests.get(f'https://solved.ac/api/v3/user/show?handle={signup_data.bj_id}')
-    if response.status_code == 200:
-        additional_user_data = response.json()
+    try:
+        additional_user_data = await solvedac.user_show(signup_data.bj_id)
+    except SolvedAcError:
+        additional_user_data = None
+    if additional_user_data is not None:
 
         # Combine the fetched data with bj_id and nickname
         info_data = {
@@ -220,22 +282,23 @@ async def signup(signup_data: SignupModel):
             "nickname": signup_data.nickname,
             "group": ["default"],  # Initialize with "default" group
             "problems": [],  # Initialize with an empty list of problems
-            "todo_problems": [] 
-            
+            "todo_problems": [],
+            "profileUpdatedAt": datetime.utcnow(),
         }
 
         # Insert or update the additional user data in Info collection
-        collection_Info.find_one_and_update(
+        await db.Info.find_one_and_update(
             {"id": signup_data.id},
             {"$set": info_data},
             upsert=True
         )
-        updated_group = collection_Group.find_one_and_update(
+        updated_group = await db.Group.find_one_and_update(
         {"group_name": "default"},
         {"$addToSet": {"members": signup_data.id}},  # Use $addToSet to add unique value to array
         return_document=ReturnDocument.AFTER
         )
         if updated_group:
+            await leaderboards.join(db, "default", signup_data.id)
             return SuccessModel(success=True, message="User created successfully and added to the default group.")
         else:
             raise HTTPException(
@@ -266,37 +329,39 @@ class LoginSuccessModel(SuccessModel):
         arbitrary_types_allowed = True
 
 @app.post('/login', response_model=LoginSuccessModel)
-async def login(login_data: LoginModel):
-    user = collection_User.find_one({"id": login_data.id})
-    if user and pwd_context.verify(login_data.password, user['password']):
-        # Fetch user information from solved.ac API
-        response = requests.get(f'https://solved.ac/api/v3/user/show?handle={user.get("bj_id")}')
-        if response.status_code == 200:
-            additional_user_data = response.json()
-
-            # Prepare the updated info data
-            info_data = {
-                **additional_user_data
-            }
-
-            # Update the additional user data in Info collection
-            collection_Info.find_one_and_update(
-                {"id": login_data.id},
-                {"$set": info_data},
-                upsert=True
-            )
-
-            # Fetch updated user information from collection_Info
-            user_info = collection_Info.find_one({"id": login_data.id})
-            if user_info:
-                # Optionally remove the MongoDB '_id' field
-                user_info.pop('_id', None)
-                return LoginSuccessModel(success=True, message="Login successful.", userinfo=user_info)
-            else:
-                return LoginSuccessModel(success=False, message="User info not found after update.")
+async def login(
+    login_data: LoginModel,
+    db: Database = Depends(get_db),
+    solvedac: SolvedAcClient = Depends(get_solvedac),
+    profiles: ProfileRefresher = Depends(get_profiles),
+):
+    user = await db.User.find_one({"id": login_data.id})
+    if user and await security.verify_password(login_data.password, user['password']):
+        # Serve the cached solved.ac profile right away; solved.ac is only
+        # waited on when there is none yet, and a stale one is refreshed
+        # in the background for the next request
+        user_info = await db.Info.find_one({"id": login_data.id}, {"_id": 0})
+        if has_profile(user_info):
+            if is_stale(user_info):
+                profiles.schedule(db, solvedac, login_data.id, user.get("bj_id"))
+            user_info.pop("profileUpdatedAt", None)
         else:
-            # If the external API call fails
-            return LoginSuccessModel(success=False, message="Failed to fetch additional user data from solved.ac.")
+            try:
+                user_info = await profiles.refresh(db, solvedac, login_data.id, user.get("bj_id"))
+            except (SolvedAcError, httpx.HTTPError):
+                # solved.ac being down doesn't lock users out: log them in
+                # with what is stored, and fetch the profile next time
+                logging.warning("Profile fetch failed at login for %s", login_data.id, exc_info=True)
+                profile_refreshes.inc(labels=("inline", "error"))
+                if user_info is None:
+                    user_info = {"id": user["id"], "bj_id": user.get("bj_id"), "nickname": user.get("nickname")}
+                user_info.pop("profileUpdatedAt", None)
+            else:
+                profile_refreshes.inc(labels=("inline", "ok"))
+
+        # The Info document is the full solved.ac profile: send it as is
+        # instead of re-validating and re-encoding it
+        return MongoJSONResponse({"success": True, "message": "Login successful.", "userinfo": user_info})
     else:
         return LoginSuccessModel(success=False, message="Incorrect ID or password.")
 
@@ -320,13 +385,11 @@ class UserIdModel(BaseModel):
     id: str
 
 @app.post('/user_Info', response_model=Dict[str, Any])
-async def user_info(user_id_data: UserIdModel):
-    user_info = collection_Info.find_one({"id": user_id_data.id})
+async def user_info(user_id_data: UserIdModel, db: Database = Depends(get_db)):
+    user_info = await db.Info.find_one({"id": user_id_data.id}, INFO_PROJECTION)
     
     if user_info:
-        # Optionally remove the MongoDB '_id' field
-        user_info.pop('_id', None)
-        return user_info
+        return MongoJSONResponse(user_info)
     else:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -335,15 +398,6 @@ class GroupActionModel(BaseModel):
     id: str
     group_name: str
 
-def convert_objectid_to_string(value):
-    if isinstance(value, ObjectId):
-        return str(value)
-    elif isinstance(value, dict):
-        for key in value:
-            value[key] = convert_objectid_to_string(value[key])
-    elif isinstance(value, list):
-        value = [convert_objectid_to_string(item) for item in value]
-    return value
 
 
 class GroupModel(BaseModel):
@@ -358,8 +412,8 @@ class GroupModel(BaseModel):
     members: List[str]
 
 # Utility function to get the full group info
-async def get_full_group_info(group_name: str) -> GroupModel:
-    group = collection_Group.find_one({"group_name": group_name})
+async def get_full_group_info(group_name: str, db: Database) -> GroupModel:
+    group = await db.Group.find_one({"group_name": group_name})
     if group:
         # Optionally remove sensitive data before returning
         # group.pop('password', None)  # Remove password for security reasons
@@ -395,58 +449,24 @@ class StartTimerRequest(BaseModel):
 
 
 @app.post("/start")
-async def start_timer(request_data: StartTimerRequest):
+async def start_timer(
+    request_data: StartTimerRequest,
+    db: Database = Depends(get_db),
+    broadcast: MemoryBroadcast = Depends(get_broadcast),
+    presence: PresenceRegistry = Depends(get_presence),
+):
     user_id = request_data.id
-    date = request_data.date
-
-    existing_timer_data = collection_Timer.find_one(
-        {"id": user_id, "dates.date": date}
-    )
-    # Update the isStudy status and recent timestamp
-    if not existing_timer_data:
-        collection_Timer.update_one(
-            {"id": user_id},
-            {
-                "$addToSet": {
-            "dates": {
-            "date": date,
-            "duration": 0
-            }
-            },
-                "$set": {
-                "isStudy": True,
-                "recent": datetime.utcnow()
-            }
-        },
-        upsert=True
-        )
+    date = timer_store.check_date(request_data.date)
 
-        # If the date already exists, just update 'isStudy' and 'recent'
-    else:
-        collection_Timer.update_one(
-                {"id": user_id},
-                {
-                    "$set": {
-                        "isStudy": True,
-                        "recent": datetime.utcnow()
-                    }
-                }
-            )
+    # Update the isStudy status and recent timestamp (written to Timer by
+    # the presence registry's next flush)
+    await presence.start(db, user_id)
 
-    # Check if the update was successful
-    updated_timer_data = collection_Timer.find_one(
-    {"id": user_id, "dates.date": date},
-    {"dates.$": 1}
-    )
-
-    if not updated_timer_data or "dates" not in updated_timer_data or len(updated_timer_data["dates"]) == 0:
-        raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail=f"No duration found for user ID {user_id} on date {date}."
-    )
+    # Add the date with a zero duration if it isn't there yet
+    duration = await timer_store.open_day(db, user_id, date)
 
-# Extract the duration for the response
-    duration = updated_timer_data["dates"][0]["duration"]
+    # Push the change to everyone watching this user's groups (/timer/ws)
+    await broadcast.publish(timer_channel(user_id), {"type": "start", "id": user_id, "isStudy": True, "date": date, "duration": duration})
 
     return {"duration": duration}
 
@@ -513,50 +533,40 @@ class StopTimerRequest(BaseModel):
     
 #     return {"id": user_id, "date": date, "duration": updated_duration}
 @app.post("/stop")
-async def stop_timer(request_data: StopTimerRequest):
+async def stop_timer(
+    request_data: StopTimerRequest,
+    db: Database = Depends(get_db),
+    broadcast: MemoryBroadcast = Depends(get_broadcast),
+    presence: PresenceRegistry = Depends(get_presence),
+    leaderboards: LeaderboardStore = Depends(get_leaderboards),
+):
     user_id = request_data.id
-    date = request_data.date
+    date = timer_store.check_date(request_data.date)
     new_duration = request_data.duration  # Duration received from the POST request
 
-    # Check if the timer data exists for the given user ID and date
-    timer_data = collection_Timer.find_one(
-        {"id": user_id, "dates.date": date}
-    )
-
-    if not timer_data:
+    # Check if the timer data exists for the given user ID
+    if await presence.load(db, user_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No timer found for user ID {user_id}."
         )
 
-    # Find the index of the date entry to update
-    date_entry_index = next(
-        (index for (index, d) in enumerate(timer_data["dates"]) if d["date"] == date), None
-    )
+    # Update the duration directly with the new_duration received
+    previous_duration = await timer_store.set_day(db, user_id, date, new_duration)
 
-    if date_entry_index is None:
+    if previous_duration is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No date entry found for user ID {user_id} on date {date}."
         )
 
-    # Update the duration directly with the new_duration received
-    update_result = collection_Timer.update_one(
-        {"id": user_id},
-        {
-            "$set": {
-                f"dates.{date_entry_index}.duration": new_duration,
-                "isStudy": False,
-                "recent": datetime.utcnow()
-            }
-        }
-    )
+    await presence.stop(db, user_id)
 
-    if update_result.modified_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Failed to update timer for user ID {user_id}."
-        )
+    # Keep the day/week/month rollups used by the rankings in step
+    await rollup.record_duration(db, user_id, date, previous_duration, new_duration)
+    await leaderboards.record(user_id, date, new_duration - previous_duration)
+
+    await broadcast.publish(timer_channel(user_id), {"type": "stop", "id": user_id, "isStudy": False, "date": date, "duration": new_duration})
 
     # Return the updated duration
     return {"id": user_id, "date": date, "duration": new_duration}
@@ -567,35 +577,37 @@ class Problem(BaseModel):
 
 
 @app.post("/user/problem/insert")
-async def add_problem_to_user(problem: Problem):
+async def add_problem_to_user(problem: Problem, db: Database = Depends(get_db), solved_cache: SolvedCache = Depends(get_solved_cache)):
     user_id = problem.id
     user_problem = problem.problem
+    # Saved problems are no longer recommended to this user
+    solved_cache.add(user_id, user_problem)
 
     # Check if the user exists in the collection.
-    user = collection_Info.find_one({"id": user_id})
+    user = await db.Info.find_one({"id": user_id})
     if user:
         # Check if the problem already exists for the user.
         if user_problem not in user.get('problems', []):
-            collection_Info.update_one({"id": user_id}, {"$push": {"problems": user_problem}})
+            await db.Info.update_one({"id": user_id}, {"$push": {"problems": user_problem}})
             return {"message": "Problem added to the user."}
         else:
             raise HTTPException(status_code=400, detail="Problem already exists for the user.")
     else:
         # If the user does not exist, create a new entry.
-        await collection_Info.insert_one({"id": user_id, "problems": [user_problem]})
+        await db.Info.insert_one({"id": user_id, "problems": [user_problem]})
         return {"message": "User created and problem added."}
     
 @app.delete("/user/problem/delete")
-async def delete_problem_from_user(problem_data: Problem):
+async def delete_problem_from_user(problem_data: Problem, db: Database = Depends(get_db)):
     user_id = problem_data.id
     problem_to_delete = problem_data.problem
 
     # Check if the user exists in the collection.
-    user = collection_Info.find_one({"id": user_id})
+    user = await db.Info.find_one({"id": user_id})
     if user:
         # Check if the problem exists in the user's problems.
         if problem_to_delete in user.get('problems', []):
-            collection_Info.update_one({"id": user_id}, {"$pull": {"problems": problem_to_delete}})
+            await db.Info.update_one({"id": user_id}, {"$pull": {"problems": problem_to_delete}})
             return {"message": "Problem deleted from the user."}
         else:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Problem not found in the user.")
@@ -604,35 +616,37 @@ async def delete_problem_from_user(problem_data: Problem):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
 
 @app.post("/user/todoproblem/insert")
-async def add_problem_to_user(problem: Problem):
+async def add_problem_to_user(problem: Problem, db: Database = Depends(get_db), solved_cache: SolvedCache = Depends(get_solved_cache)):
     user_id = problem.id
     user_problem = problem.problem
+    # Saved problems are no longer recommended to this user
+    solved_cache.add(user_id, user_problem)
 
     # Check if the user exists in the collection.
-    user = collection_Info.find_one({"id": user_id})
+    user = await db.Info.find_one({"id": user_id})
     if user:
         # Check if the problem already exists for the user.
         if user_problem not in user.get('todo_problems', []):
-            collection_Info.update_one({"id": user_id}, {"$push": {"todo_problems": user_problem}})
+            await db.Info.update_one({"id": user_id}, {"$push": {"todo_problems": user_problem}})
             return {"message": "Problem added to the user."}
         else:
             raise HTTPException(status_code=400, detail="Problem already exists for the user.")
     else:
         # If the user does not exist, create a new entry.
-        await collection_Info.insert_one({"id": user_id, "todo_problems": [user_problem]})
+        await db.Info.insert_one({"id": user_id, "todo_problems": [user_problem]})
         return {"message": "User created and problem added."}
     
 @app.delete("/user/todoproblem/delete")
-async def delete_problem_from_user(problem_data: Problem):
+async def delete_problem_from_user(problem_data: Problem, db: Database = Depends(get_db)):
     user_id = problem_data.id
     problem_to_delete = problem_data.problem
 
     # Check if the user exists in the collection.
-    user = collection_Info.find_one({"id": user_id})
+    user = await db.Info.find_one({"id": user_id})
     if user:
         # Check if the problem exists in the user's problems.
         if problem_to_delete in user.get('todo_problems', []):
-            collection_Info.update_one({"id": user_id}, {"$pull": {"todo_problems": problem_to_delete}})
+            await db.Info.update_one({"id": user_id}, {"$pull": {"todo_problems": problem_to_delete}})
             return {"message": "Problem deleted from the user."}
         else:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Problem not found in the user.")
@@ -642,47 +656,27 @@ async def delete_problem_from_user(problem_data: Problem):
 
 
 @app.get('/problem/{problemId}')
-async def getProblemInfo(problemId : str):
+async def getProblemInfo(problemId : str, db: Database = Depends(get_db), solvedac: SolvedAcClient = Depends(get_solvedac)):
 
+    # Fetch the problem through the shared (cached) solved.ac client
     try:
-        # Correctly format the URL with the problemId
-        url = f'https://solved.ac/api/v3/problem/show?problemId={problemId}'
-
-        # Make a GET request to the external API
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-
-        # Check if the response status code is 200 (OK)
-        if response.status_code == 200:
-            # Parse the JSON response
-            data = response.json()
-            
-            # Extract relevant fields directly from the data
-            problem_id = data['problemId']
-            title_ko = data['titleKo']
-            level = data['level']
-            key = data['tags'][0]['key'] if data['tags'] else None
-                
-            problem_data = {
-                'problemId': problem_id,
-                'titleKo': title_ko,
-                'level': level,
-                'key': key
-            }
-            
-            # Check if a document with the same problemId exists in the collection_Problems
-            existing_problem = collection_Problems.find_one({'problemId': problem_id})
-            
-            if not existing_problem:
-                # If it doesn't exist, insert the new document
-                collection_Problems.insert_one(problem_data)
-            
-            # Return the problem data as a dictionary
-            return problem_data
-        else:
-            # If the response status code is not 200, raise an HTTPException
-            raise HTTPException(status_code=response.status_code, detail="External API request failed")
-    
+        data = await solvedac.problem_show(problemId)
+    except SolvedAcError as e:
+        # If the response status code is not 200, raise an HTTPException
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except httpx.RequestError as e:
         # Handle any network-related errors here
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Extract relevant fields directly from the data
+    problem_data = ingest.problem_document(data)
+    
+    # Insert the problem unless a document with the same problemId exists
+    await db.Problems.update_one(
+        {'problemId': problem_data['problemId']},
+        {'$setOnInsert': {**problem_data, 'updatedAt': datetime.utcnow()}},
+        upsert=True
+    )
+    
+    # Return the problem data as a dictionary
+    return problem_data
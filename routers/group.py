@@ -1,17 +1,18 @@
 from typing import List
 from typing import Optional, Any, Dict
-from fastapi import Body, FastAPI, HTTPException, Request, Response, status, websockets , APIRouter
+from fastapi import Body, Depends, FastAPI, HTTPException, Request, Response, status, websockets , APIRouter
 from pydantic import BaseModel, Field
-from pymongo import MongoClient, ReturnDocument
-from passlib.context import CryptContext
-import os
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import re
 from fastapi.middleware.cors import CORSMiddleware 
-from bson import ObjectId
-from fastapi.encoders import jsonable_encoder
+from src.db import Database, get_db
+from src.leaderboard import LeaderboardStore, get_leaderboards
+from src.security import hash_password
+from src.serialization import MongoJSONResponse, projection
 
 group = APIRouter(prefix='/group')
 
-import requests
 # group.add_middleware(
 #     CORSMiddleware,
 #     allow_origins=["*"],
@@ -19,18 +20,6 @@ import requests
 #     allow_methods=["*"],
 #     allow_headers=["*"],
 # )
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# MongoDB client initialization
-
-CLIENT = os.environ.get("CLIENT")
-
-client = MongoClient(CLIENT)
-db = client['MadCampWeek3']
-collection_User = db['User']
-collection_Info = db['Info']
-collection_Group = db['Group']
 
 class SuccessModel(BaseModel):
     success: bool
@@ -48,14 +37,14 @@ class GroupModel(BaseModel):
     problems: Optional[List[str]] = []  # Make 'problems' optional with a default empty list
 
 # Utility function to get the full group info
-async def get_full_group_info(group_name: str) -> GroupModel:
-    group = collection_Group.find_one({"group_name": group_name})
+async def get_full_group_info(group_name: str, db: Database) -> MongoJSONResponse:
+    # Only GroupModel's fields are fetched (so never _id or the password) and
+    # sent without re-validating them
+    group = await db.Group.find_one({"group_name": group_name}, projection(GroupModel))
     if group:
-        # Convert ObjectId to string if necessary
-        group = jsonable_encoder(group, custom_encoder={ObjectId: str})
         # Check if 'problems' exists, if not, set a default value
         group.setdefault('problems', [])  # This line ensures 'problems' key exists
-        return GroupModel(**group)
+        return MongoJSONResponse(group)
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
 
@@ -75,29 +64,40 @@ class GroupResponseModel(BaseModel):
     members: List[MemberInfoModel]
 
 
+MEMBER_INFO_PROJECTION = projection(MemberInfoModel)
+
+
 @group.post('/member', tags=['group'], response_model=GroupResponseModel)
-async def get_group_info(group_request: GroupRequestModel):
-    group_data = collection_Group.find_one({"group_name": group_request.group_name})
+async def get_group_info(group_request: GroupRequestModel, db: Database = Depends(get_db)):
+    group_data = await db.Group.find_one({"group_name": group_request.group_name}, {"_id": 0, "members": 1})
     if not group_data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
-    
+
+    # One $in query for the whole group, fetching only the fields the page
+    # shows (Info also holds the full solved.ac profile), then put the
+    # results back in membership order
+    member_ids = group_data.get('members', [])
+    infos = {}
+    async for member_info in db.Info.find({"id": {"$in": member_ids}}, MEMBER_INFO_PROJECTION):
+        infos[member_info['id']] = member_info
+
     member_infos = []
-    for member_id in group_data.get('members', []):
-        member_info = collection_Info.find_one({"id": member_id})
+    for member_id in member_ids:
+        member_info = infos.get(member_id)
         if member_info:
             member_infos.append(
-                MemberInfoModel(
-                    id=member_id,
-                    nickname=member_info['nickname'],
-                    bj_id=member_info['bj_id'],
-                    profileImageUrl=member_info.get('profileImageUrl'), 
-                    solvedCount=member_info.get('solvedCount', 0),  # Ensuring an integer is set
-                    rank=member_info.get('rank', 0),  # Ensuring an integer is set
-                    rating=member_info.get('rating', 0),  
-                )
+                {
+                    "id": member_id,
+                    "nickname": member_info['nickname'],
+                    "bj_id": member_info['bj_id'],
+                    "profileImageUrl": member_info.get('profileImageUrl'),
+                    "solvedCount": member_info.get('solvedCount', 0),  # Ensuring an integer is set
+                    "rank": member_info.get('rank', 0),  # Ensuring an integer is set
+                    "rating": member_info.get('rating', 0),
+                }
             )
     
-    return GroupResponseModel(members=member_infos)
+    return MongoJSONResponse({"members": member_infos})
 # @group.post('/member', tags=['group'], response_model=GroupResponseModel)
 # async def get_group_info(group_request: GroupRequestModel):
 #     group_data = collection_Group.find_one({"group_name": group_request.group_name})
@@ -119,15 +119,6 @@ class GroupActionModel(BaseModel):
     id: str
     group_name: str
 
-def convert_objectid_to_string(value):
-    if isinstance(value, ObjectId):
-        return str(value)
-    elif isinstance(value, dict):
-        for key in value:
-            value[key] = convert_objectid_to_string(value[key])
-    elif isinstance(value, list):
-        value = [convert_objectid_to_string(item) for item in value]
-    return value
 
 
 
@@ -144,49 +135,51 @@ def convert_objectid_to_string(value):
 
 
 @group.post('/join', tags=['group'],response_model=GroupModel)
-async def join_group(data: GroupActionModel):
+async def join_group(data: GroupActionModel, db: Database = Depends(get_db), leaderboards: LeaderboardStore = Depends(get_leaderboards)):
     # Find the group by name
-    group = collection_Group.find_one({"group_name": data.group_name})
+    group = await db.Group.find_one({"group_name": data.group_name})
     if not group:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
     
     # Find the user info and check if they are already in the group
-    user_info = collection_Info.find_one({"id": data.id})
+    user_info = await db.Info.find_one({"id": data.id})
     if not user_info:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User info not found")
     
     # If the user is not already in the group, add them
     if data.group_name not in user_info.get('group', []):
-        collection_Info.update_one({"id": data.id}, {"$addToSet": {"group": data.group_name}})
+        await db.Info.update_one({"id": data.id}, {"$addToSet": {"group": data.group_name}})
     if data.id not in group.get('members', []):
-        collection_Group.update_one(
+        await db.Group.update_one(
             {"group_name": data.group_name},
             {"$addToSet": {"members": data.id}}
         )
-        return await get_full_group_info(data.group_name) # Return full group info after joining
+        await leaderboards.join(db, data.group_name, data.id)
+        return await get_full_group_info(data.group_name, db) # Return full group info after joining
     else:
 # User is already a member of the group, so just return the group info
-        return await get_full_group_info(data.group_name)
+        return await get_full_group_info(data.group_name, db)
 
 @group.delete('/leave',tags=['group'], response_model=GroupModel)
-async def leave_group(data: GroupActionModel):
+async def leave_group(data: GroupActionModel, db: Database = Depends(get_db), leaderboards: LeaderboardStore = Depends(get_leaderboards)):
 # Find the group by name
-    group = collection_Group.find_one({"group_name": data.group_name})
+    group = await db.Group.find_one({"group_name": data.group_name})
     if not group:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
-    user_info = collection_Info.find_one({"id": data.id})
+    user_info = await db.Info.find_one({"id": data.id})
     if not user_info:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User info not found")
 
 # If the user is in the group, remove them
     if data.group_name in user_info.get('group', []):
-        collection_Info.update_one({"id": data.id}, {"$pull": {"group": data.group_name}})
+        await db.Info.update_one({"id": data.id}, {"$pull": {"group": data.group_name}})
     if data.id in group.get('members', []):
-        collection_Group.update_one(
+        await db.Group.update_one(
         {"group_name": data.group_name},
         {"$pull": {"members": data.id}}
     )
-        return await get_full_group_info(data.group_name)  # Return full group info after leaving
+        await leaderboards.leave(data.group_name, data.id)
+        return await get_full_group_info(data.group_name, db)  # Return full group info after leaving
     else:
     # User is not a member of the group, so raise an error
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not in the group")
@@ -202,13 +195,13 @@ class GroupCreateModel(BaseModel):
     group_bio: str
 
 @group.post('/create', tags=['group'],response_model=SuccessModel)
-async def create_group(group_data: GroupCreateModel):
+async def create_group(group_data: GroupCreateModel, db: Database = Depends(get_db), leaderboards: LeaderboardStore = Depends(get_leaderboards)):
     # Check if a group with the same name already exists
-    if collection_Group.find_one({"group_name": group_data.group_name}):
+    if await db.Group.find_one({"group_name": group_data.group_name}):
         return SuccessModel(success=False, message="Group name already exists.")
 
     # Hash the group password
-    hashed_password = pwd_context.hash(group_data.password)
+    hashed_password = await hash_password(group_data.password)
 
     # Prepare the new group data
     new_group = {
@@ -224,15 +217,20 @@ async def create_group(group_data: GroupCreateModel):
         "problems" : [] # Initialize with an empty list of members
     }
 
-    # Insert the new group into the Group collection
-    collection_Group.insert_one(new_group)
-    collection_Info.update_one(
+    # Insert the new group into the Group collection; the unique index on
+    # group_name catches a concurrent create that passed the check above
+    try:
+        await db.Group.insert_one(new_group)
+    except DuplicateKeyError:
+        return SuccessModel(success=False, message="Group name already exists.")
+    await leaderboards.join(db, group_data.group_name, group_data.manager_id)
+    await db.Info.update_one(
         {"id": group_data.manager_id},
         {"$addToSet": {"group": group_data.group_name}}
     )
     
     # Check if the update was successful
-    manager_info = collection_Info.find_one({"id": group_data.manager_id})
+    manager_info = await db.Info.find_one({"id": group_data.manager_id})
     if group_data.group_name in manager_info.get("group", []):
         return SuccessModel(success=True, message="New group created successfully and manager updated.")
     else:
@@ -249,14 +247,14 @@ class GroupUpdateModel(BaseModel):
 
 # Endpoint to update group information
 @group.post('/update',tags=['group'], response_model=SuccessModel)
-async def update_group(group_update_data: GroupUpdateModel):
+async def update_group(group_update_data: GroupUpdateModel, db: Database = Depends(get_db)):
     # Find the group by group_name
-    group = collection_Group.find_one({"group_name": group_update_data.group_name})
+    group = await db.Group.find_one({"group_name": group_update_data.group_name})
     if not group:
         return SuccessModel(success=False, message="Group not found.")
 
     # Hash the password if it's not empty
-    hashed_password = pwd_context.hash(group_update_data.password) if group_update_data.password else group.get('password')
+    hashed_password = await hash_password(group_update_data.password) if group_update_data.password else group.get('password')
 
     # Prepare the updated group data
     update_data = {
@@ -267,7 +265,7 @@ async def update_group(group_update_data: GroupUpdateModel):
         "group_bio": group_update_data.group_bio
     }
         
-    result = collection_Group.update_one(
+    result = await db.Group.update_one(
     {"group_name": group_update_data.group_name},
     {"$set": update_data}
     )
@@ -282,29 +280,24 @@ async def update_group(group_update_data: GroupUpdateModel):
         return SuccessModel(success=False, message="Update failed.")
     
 @group.post('/Info', tags=['group'],response_model=GroupModel)
-async def get_group_info(group_name: str = Body(..., embed=True)):
-    group_document = collection_Group.find_one({"group_name": group_name})
-    if group_document:
-        group_document.pop('_id')  # Remove the MongoDB generated ID
-        group_document.pop('password', None)  # Do not return the password
-        return GroupModel(**group_document)
-    else:
-        raise HTTPException(status_code=404, detail="Group not found")
+async def get_group_info(group_name: str = Body(..., embed=True), db: Database = Depends(get_db)):
+    # Projected to GroupModel's fields: no _id, and never the password
+    return await get_full_group_info(group_name, db)
 class GroupProblem(BaseModel):
     group_name: str
     problem: str 
 
 @group.post("/problem/insert")
-async def add_problem_to_group(group_problem: GroupProblem):
+async def add_problem_to_group(group_problem: GroupProblem, db: Database = Depends(get_db)):
     group_name = group_problem.group_name
     problem = group_problem.problem
 
     # Check if the group exists in the collection.
-    group = collection_Group.find_one({"group_name": group_name})
+    group = await db.Group.find_one({"group_name": group_name})
     if group:
         # Check if the problem already exists in the group's problems.
         if problem not in group.get('problems', []):
-            collection_Group.update_one({"group_name": group_name}, {"$push": {"problems": problem}})
+            await db.Group.update_one({"group_name": group_name}, {"$push": {"problems": problem}})
             return {"message": "Problem added to the group."}
         else:
             raise HTTPException(status_code=400, detail="Problem already exists in the group.")
@@ -316,17 +309,17 @@ async def add_problem_to_group(group_problem: GroupProblem):
 
 
 @group.delete("/problem/delete")
-async def delete_problem_from_group(group_problem: GroupProblem):
+async def delete_problem_from_group(group_problem: GroupProblem, db: Database = Depends(get_db)):
     group_name = group_problem.group_name
     problem = group_problem.problem
 
 
     # Check if the group exists in the collection.
-    group = collection_Group.find_one({"group_name": group_name})
+    group = await db.Group.find_one({"group_name": group_name})
     if group:
         # Check if the problem exists in the group's problems.
         if problem in group.get('problems', []):
-            collection_Group.update_one({"group_name": group_name}, {"$pull": {"problems": problem}})
+            await db.Group.update_one({"group_name": group_name}, {"$pull": {"problems": problem}})
             return {"message": "Problem deleted from the group."}
         else:
             raise HTTPException(status_code=404, detail="Problem not found in the group.")
@@ -336,12 +329,63 @@ async def delete_problem_from_group(group_problem: GroupProblem):
         raise HTTPException(status_code=404, detail="Group not found.")
     
 
-@group.get("/list")
-async def get_group_list():
-    # Query the collection_Group to retrieve all group names
-    group_names_cursor = collection_Group.find({}, {"group_name": 1, "_id": 0})
+GROUP_LIST_PAGE_SIZE = 100
+GROUP_LIST_MAX_LIMIT = 200
+
+
+def group_list_filter(
+    after: Optional[str],
+    prefix: Optional[str],
+    tier: Optional[int],
+    is_secret: Optional[bool],
+    min_members: Optional[int],
+    max_members: Optional[int],
+) -> dict:
+    # Keyset pagination and prefix search both become bounds on the unique
+    # group_name index; the remaining filters are checked on the documents
+    # the index scan visits.
+    name = {}
+    if after is not None:
+        name["$gt"] = after
+    if prefix:
+        # Anchored, case-sensitive regexes are turned into an index range
+        name["$regex"] = "^" + re.escape(prefix)
+    query = {"group_name": name} if name else {}
+    if tier is not None:
+        query["tier"] = tier
+    if is_secret is not None:
+        query["is_secret"] = is_secret
+    # "members.<n-1> exists" means at least n members
+    if min_members is not None and min_members > 0:
+        query[f"members.{min_members - 1}"] = {"$exists": True}
+    if max_members is not None:
+        query[f"members.{max(max_members, 0)}"] = {"$exists": False}
+    return query
 
-    # Extract the group names from the cursor
-    group_names = [group["group_name"] for group in group_names_cursor]
 
-    return {"group_names": group_names}
\ No newline at end of file
+@group.get("/list")
+async def get_group_list(
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    prefix: Optional[str] = None,
+    tier: Optional[int] = None,
+    is_secret: Optional[bool] = None,
+    min_members: Optional[int] = None,
+    max_members: Optional[int] = None,
+    db: Database = Depends(get_db),
+):
+    # Group names in name order. Passing `limit` (at most 200) or `after`
+    # opts into paging: the response then also carries `next`, to be passed
+    # as `after` for the following page, null on the last one. Without them
+    # every matching name is returned, as before paging existed.
+    cursor = db.Group.find(
+        group_list_filter(after, prefix, tier, is_secret, min_members, max_members),
+        {"group_name": 1, "_id": 0},
+    ).sort("group_name", ASCENDING)
+    if limit is None and after is None:
+        return MongoJSONResponse({"group_names": [group_data["group_name"] async for group_data in cursor]})
+
+    limit = min(max(limit or GROUP_LIST_PAGE_SIZE, 1), GROUP_LIST_MAX_LIMIT)
+    group_names = [group_data["group_name"] for group_data in await cursor.limit(limit).to_list(length=limit)]
+    next_after = group_names[-1] if len(group_names) == limit else None
+    return MongoJSONResponse({"group_names": group_names, "next": next_after})
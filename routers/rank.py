@@ -1,170 +1,126 @@
 
 from ast import Dict, List
-import os
 from datetime import datetime
 from pstats import Stats
 import statistics
+from typing import Union
 from bson import Timestamp
 from fastapi import HTTPException, APIRouter, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from passlib.context import CryptContext
 from pydantic import BaseModel
-from pymongo import MongoClient
-import socketio
 from fastapi import FastAPI, WebSocket
-from motor.motor_asyncio import AsyncIOMotorClient
+from src import rollup
+from src.db import Database, get_db
+from src.serialization import MongoJSONResponse
+from src.leaderboard import Leaderboard, LeaderboardStore, get_leaderboards
 
 # FastAPI app and APIRouter initialization
 rank = APIRouter(prefix="/rank")
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# MongoDB client initialization
-CLIENT = os.environ.get("CLIENT")
-print("Connecting to MongoDB with URI:", CLIENT)  # For debugging
-
-client = AsyncIOMotorClient(CLIENT)
-db = client['MadCampWeek3']
-collection_User = db['User']
-collection_Info = db['Info']
-collection_Group = db['Group']
-collection_Timer = db['Timer']
-
-
-
 
 class GroupQuery(BaseModel):
     group_name: str
     date: str
 
 
-@rank.post("/individual_day")
-async def rank_individual_day(query: GroupQuery):
-    # Find the group by group name
-    group = await collection_Group.find_one({"group_name": query.group_name})
-    if not group:
-        raise HTTPException(status_code=404, detail=f"Group '{query.group_name}' not found.")
-
-    # Extract the list of members' IDs from the group
-    member_ids = group.get("members", [])
-
-    # Prepare to collect the durations for each member
-    durations = []
-
-    # Convert the string date to a datetime object for querying
-    query_date = query.date
-
-    # Loop through each member ID and collect their duration
-    for member_id in member_ids:
-        timer_entries_cursor = collection_Timer.find({"id": member_id, "dates.date": query_date})
-        timer_entries = await timer_entries_cursor.to_list(length=100)
-        
-        print(f"Member ID: {member_id}, Timer Entries: {timer_entries}")
-
-        member_duration = {
-            "id": member_id,
-            "duration": 0  # Initialize duration as 0
-        }
+INFO_FIELDS = ("nickname", "bj_id", "solvedCount", "tier")
 
-        for entry in timer_entries:
-            for date_entry in entry.get('dates', []):
-                if date_entry.get('date') == query_date:
-                    print(f"Found matching entry for Member ID: {member_id}, Duration: {date_entry.get('duration', 0)}")
-                    member_duration["duration"] += int(date_entry.get('duration', 0))
 
-        member_info = await collection_Info.find_one({"id": member_id})
-        member_duration["nickname"] = member_info.get("nickname", "Unknown") if member_info else "Unknown"
-        member_duration["bj_id"] = member_info.get("bj_id", "Unknown") if member_info else "Unknown"
-        member_duration["solvedCount"] = member_info.get("solvedCount", "Unknown") if member_info else "Unknown"
-        member_duration["tier"] = member_info.get("tier", "Unknown") if member_info else "Unknown"
+async def describe(db: Database, rows: list, first_rank: int = None) -> list:
+    # Attach the members' Info fields to (id, duration) leaderboard rows with
+    # one $in query for just those rows
+    infos = {}
+    async for info in db.Info.find(
+        {"id": {"$in": [user_id for user_id, _ in rows]}}, {"_id": 0, "id": 1, **{field: 1 for field in INFO_FIELDS}}
+    ):
+        infos.setdefault(info["id"], info)
+    members = []
+    for i, (user_id, duration) in enumerate(rows):
+        info = infos.get(user_id, {})
+        member = {"id": user_id, "duration": duration, **{field: info.get(field, "Unknown") for field in INFO_FIELDS}}
+        if first_rank is not None:
+            member["rank"] = first_rank + i
+        members.append(member)
+    return members
 
 
+async def get_board(db: Database, leaderboards: LeaderboardStore, group_name: str, period: str, key: str) -> Leaderboard:
+    if period not in rollup.PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(rollup.PERIODS)}.")
+    board = await leaderboards.get(db, group_name, period, key)
+    if board is None:
+        raise HTTPException(status_code=404, detail=f"Group '{group_name}' not found.")
+    return board
 
 
-        
-        durations.append(member_duration)
+async def run_ranking(db: Database, leaderboards: LeaderboardStore, group_name: str, period: str, key: str) -> list:
+    board = await get_board(db, leaderboards, group_name, period, key)
+    return await describe(db, board.page())
 
-    # Sort the durations by the duration in descending order
-    sorted_durations = sorted(durations, key=lambda x: int(x['duration']), reverse=True)
 
-    # for duration_entry in sorted_durations:
-    #     member_info = collection_Info.find_one({"id": duration_entry["id"]})
-    #     duration_entry["nickname"] = member_info.get("nickname", "")
-
-    return sorted_durations
+@rank.post("/individual_day")
+async def rank_individual_day(query: GroupQuery, db: Database = Depends(get_db), leaderboards: LeaderboardStore = Depends(get_leaderboards)):
+    return MongoJSONResponse(await run_ranking(db, leaderboards, query.group_name, "day", query.date))
 
 class MonthQuery(BaseModel):
     group_name: str
     date: str
 
+# The rows run_ranking returns (sent without re-validation): members with
+# no Info profile have "Unknown" for every Info field
 class MemberDurationModel(BaseModel):
     id: str
     nickname : str
     bj_id : str
-    solvedCount : int
+    solvedCount : Union[int, str]
     duration: int
-    tier : int
+    tier : Union[int, str]
 
 
 @rank.post("/individual_month", response_model=list[MemberDurationModel])
-async def rank_individual_month(query: MonthQuery):
-    # Find the group by group name
-    group = await collection_Group.find_one({"group_name": query.group_name})
-    if not group:
-        raise HTTPException(status_code=404, detail=f"Group '{query.group_name}' not found.")
+async def rank_individual_month(query: MonthQuery, db: Database = Depends(get_db), leaderboards: LeaderboardStore = Depends(get_leaderboards)):
+    # Keep the string date as it is for querying (YYYY-MM format)
+    return MongoJSONResponse(await run_ranking(db, leaderboards, query.group_name, "month", query.date))
 
-    # Extract the list of members' IDs from the group
-    member_ids = group.get("members", [])
 
-    # Keep the string date as it is for querying (YYYY-MM format)
-    query_month = query.date
-
-    # Prepare to collect the total durations for each member
-    member_durations = []
-
-    # Loop through each member ID and collect their total duration for the specified month
-    for member_id in member_ids:
-        timer_entries_cursor = collection_Timer.find({"id": member_id})
-        timer_entries = await timer_entries_cursor.to_list(length=100)
-
-        member_duration = {
-            "id": member_id, # Initialize duration as 0
-        }
-
-        # Initialize the total duration for the member
-        total_duration = 0
-        nickname = "Unknown" 
-        
-        # if member_info:
-        #     nickname = member_info.get("nickname", "Unknown")
-        #     print(nickname)
-        # Loop through each entry and sum the durations for the specified month
-        for entry in timer_entries:
-            for date_entry in entry.get('dates', []):
-                # Parse the date in "YYYY-MM-DD" format
-                entry_date = date_entry.get('date')
-                if entry_date.startswith(query_month):
-                    total_duration += int(date_entry.get('duration', 0))
-        
-        member_duration["duration"] = total_duration
-        
-        # Append the member's total duration to the list
-        member_info = await collection_Info.find_one({"id": member_id})
-        member_duration["nickname"] = member_info.get("nickname", "Unknown") if member_info else "Unknown"
-        member_duration["bj_id"] = member_info.get("bj_id", "Unknown") if member_info else "Unknown"
-        member_duration["solvedCount"] = member_info.get("solvedCount", "Unknown") if member_info else "Unknown"
-        member_duration["tier"] = member_info.get("tier", "Unknown") if member_info else "Unknown"
-
-
-
-        # member_durations.append({
-        #     "id": member_id,
-        #     "duration": total_duration,
-        #     "nickname" : nickname
-        # })
-        member_durations.append(member_duration)
-    # Sort the member durations by duration in descending order
-    sorted_durations = sorted(member_durations, key=lambda x: x['duration'], reverse=True)
-
-    return sorted_durations
\ No newline at end of file
+# `key` is the period's key: YYYY-MM-DD for day, YYYY-Www for week, YYYY-MM
+# for month
+class LeaderboardQuery(BaseModel):
+    group_name: str
+    period: str = "day"
+    key: str
+    offset: int = 0
+    limit: int = 20
+
+
+@rank.post("/leaderboard")
+async def leaderboard_page(query: LeaderboardQuery, db: Database = Depends(get_db), leaderboards: LeaderboardStore = Depends(get_leaderboards)):
+    board = await get_board(db, leaderboards, query.group_name, query.period, query.key)
+    offset, limit = max(query.offset, 0), min(max(query.limit, 0), 100)
+    return MongoJSONResponse({
+        "total": len(board),
+        "offset": offset,
+        "members": await describe(db, board.page(offset, limit), offset + 1),
+    })
+
+
+class MemberRankQuery(BaseModel):
+    group_name: str
+    period: str = "day"
+    key: str
+    id: str
+    radius: int = 2
+
+
+@rank.post("/member")
+async def member_rank(query: MemberRankQuery, db: Database = Depends(get_db), leaderboards: LeaderboardStore = Depends(get_leaderboards)):
+    # The member's rank plus the members just above and below them
+    board = await get_board(db, leaderboards, query.group_name, query.period, query.key)
+    position, rows, first_rank = board.around(query.id, min(max(query.radius, 0), 50))
+    if position is None:
+        raise HTTPException(status_code=404, detail=f"User '{query.id}' is not in group '{query.group_name}'.")
+    return MongoJSONResponse({
+        "rank": position,
+        "total": len(board),
+        "neighbors": await describe(db, rows, first_rank),
+    })
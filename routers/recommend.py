@@ -1,41 +1,31 @@
 
 from ast import Dict, List
 from dataclasses import Field
-import os
 from datetime import datetime
 from pstats import Stats, StatsProfile
 import statistics
 from typing import Optional
 from bson import ObjectId, Timestamp
-from fastapi import HTTPException, APIRouter, Depends
+from fastapi import HTTPException, APIRouter, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
-from passlib.context import CryptContext
 from pydantic import BaseModel, validator
-from pymongo import ASCENDING, MongoClient
-import socketio
+from pymongo import ASCENDING
 from fastapi import FastAPI, WebSocket
-from motor.motor_asyncio import AsyncIOMotorClient
+from src.db import Database, get_db
+from src.serialization import MongoJSONResponse
+from src.llm import LLMExecutor, LLMOverloaded, get_llm
+from src.problem_index import ProblemIndex, get_problem_index
+from src.solved import SolvedCache, get_solved_cache
+from src.solvedac import SolvedAcClient, get_solvedac
 from bson import ObjectId
-from src.tip import tip
+from src.tip import TIP_VERSION, generate_tip, stream_tip
+from src.tip_cache import TipCache, get_tip_cache
+from fastapi.responses import StreamingResponse
+import json
 
 # FastAPI app and APIRouter initialization
 recommend = APIRouter(prefix="/recommend")
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# MongoDB client initialization
-CLIENT = os.environ.get("CLIENT")
-print("Connecting to MongoDB with URI:", CLIENT)  # For debugging
-
-client = AsyncIOMotorClient(CLIENT)
-db = client['MadCampWeek3']
-collection_User = db['User']
-collection_Info = db['Info']
-collection_Group = db['Group']
-collection_Timer = db['Timer']
-collection_Problems = db['Problems']
-
 
 class Problem(BaseModel):
     problemId: int
@@ -56,40 +46,47 @@ class ProblemResponse(BaseModel):
 class RecommendRequest(BaseModel):
     tier: int
     keys: list[str]
+    id: Optional[str] = None  # when set, skip problems this user solved or saved
 
 @recommend.post("/list", response_model=ProblemResponse)
-async def recommend_list(request: RecommendRequest):
+async def recommend_list(
+    request: RecommendRequest,
+    db: Database = Depends(get_db),
+    problem_index: ProblemIndex = Depends(get_problem_index),
+    solved_cache: SolvedCache = Depends(get_solved_cache),
+    solvedac: SolvedAcClient = Depends(get_solvedac),
+):
     tier = request.tier
     keys = request.keys
-    # Create a filter for tier range and keys
-    filter_query = {
-        "$and": [
-            {"level": {"$gte": tier - 3, "$lte": tier + 3}},
-            {"key": {"$in": keys}}
-        ]
-    }
-    # Query the database with the filter, sort by level ascending, limit to 10 results
-    cursor = collection_Problems.find(filter_query).limit(10)
-    # Convert the cursor to a list
-    problems_list = await cursor.to_list(length=10)
+    if problem_index.loaded:
+        solved = await solved_cache.get(db, solvedac, request.id) if request.id else None
+        # Random sample over the tier +-3 window straight from memory
+        problems_list = problem_index.sample(keys, tier, 10, exclude=solved)
+    else:
+        # Index not loaded yet (e.g. Mongo was down at startup): query directly
+        filter_query = {
+            "$and": [
+                {"level": {"$gte": tier - 3, "$lte": tier + 3}},
+                {"key": {"$in": keys}}
+            ]
+        }
+        cursor = db.Problems.aggregate([{"$match": filter_query}, {"$sample": {"size": 10}}])
+        problems_list = await cursor.to_list(length=10)
 
-    problems = []
     if problems_list:
-        for prob in problems_list:
-            # Assuming 'prob' is a dictionary returned from MongoDB, we map it to our 'Problem' class
-            # We'll use the 'ObjectId' of the document as the 'id' field in 'Problem'
-            problem = Problem(
-                id=str(prob['_id']),  # Convert ObjectId to string
-                problemId=prob['problemId'],
-                titleKo=prob['titleKo'],
-                level=prob['level'],
-                key=prob['key']
-            )
-            problems.append(problem)
-        return ProblemResponse(problems=problems)
+        problems = [
+            {
+                "problemId": prob['problemId'],
+                "titleKo": prob['titleKo'],
+                "level": prob['level'],
+                "key": prob['key'],
+            }
+            for prob in problems_list
+        ]
+        return MongoJSONResponse({"problems": problems})
     else:
         raise HTTPException(
-        status_code=statistics.StatisticsError.HTTP_404_NOT_FOUND,
+        status_code=status.HTTP_404_NOT_FOUND,
         detail="No matching problems found."
         )
 
@@ -99,11 +96,67 @@ class TipRequest(BaseModel):
 
 
 @recommend.post("/tip")
-def get_tip(request: TipRequest):
+async def get_tip(
+    request: TipRequest,
+    db: Database = Depends(get_db),
+    tip_cache: TipCache = Depends(get_tip_cache),
+    llm: LLMExecutor = Depends(get_llm),
+):
     try:
-        # Call the tip function from tip.py and pass the number
-        tips = tip(request.problemId)
-        return tips
+        # Served from the tip cache; on a miss the LLM executor generates it
+        # once for every concurrent request for this problem
+        content = await tip_cache.get_or_generate(
+            db,
+            request.problemId,
+            TIP_VERSION,
+            lambda: generate_tip(llm, request.problemId),
+        )
+        return {"content": content, "type": "ai"}
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         # You can log the exception here if needed
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def sse_event(data: dict, event: str = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@recommend.post("/tip/stream")
+async def stream_tip_events(
+    request: TipRequest,
+    db: Database = Depends(get_db),
+    tip_cache: TipCache = Depends(get_tip_cache),
+    llm: LLMExecutor = Depends(get_llm),
+):
+    # Server-Sent Events: one `data: {"content": ...}` per token, then a
+    # `done` (or `error`) event. Cached tips are sent as a single chunk. If
+    # the client goes away Starlette cancels this generator, which stops the
+    # generation; only complete answers are stored in the cache.
+    cached = await tip_cache.lookup(db, request.problemId, TIP_VERSION)
+    if cached is None and llm.saturated():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many tip requests in progress, try again shortly.", headers={"Retry-After": "5"})
+
+    async def events():
+        if cached is not None:
+            yield sse_event({"content": cached})
+            yield sse_event({}, "done")
+            return
+        parts = []
+        try:
+            async for token in stream_tip(llm, request.problemId):
+                parts.append(token)
+                yield sse_event({"content": token})
+        except Exception as e:
+            yield sse_event({"error": str(e) or "An error occurred during the AI response generation."}, "error")
+            return
+        await tip_cache.store(db, request.problemId, TIP_VERSION, "".join(parts))
+        yield sse_event({}, "done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
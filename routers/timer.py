@@ -1,53 +1,34 @@
 from ast import Dict, List
-import os
+import asyncio
 from datetime import datetime
 from pstats import Stats
 import statistics
 from bson import Timestamp
-from fastapi import HTTPException, APIRouter, Depends
+from fastapi import HTTPException, APIRouter, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
-from passlib.context import CryptContext
 from pydantic import BaseModel
-from pymongo import MongoClient
-import socketio
-from fastapi import FastAPI, WebSocket
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from src import timer_store
+from src.broadcast import MemoryBroadcast, timer_channel
+from src.db import Database, get_db
+from src.presence import PresenceRegistry, get_presence
+from src.serialization import MongoJSONResponse
 
 # FastAPI app and APIRouter initialization
 timer = APIRouter(prefix="/timer")
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# MongoDB client initialization
-CLIENT = os.environ.get("CLIENT")
-print("Connecting to MongoDB with URI:", CLIENT)  # For debugging
-
-client = MongoClient(CLIENT)
-db = client['MadCampWeek3']
-collection_User = db['User']
-collection_Info = db['Info']
-collection_Group = db['Group']
-collection_Timer = db['Timer']
-
 
 @timer.get("/duration/{user_id}/{date}")
-async def get_duration(user_id: str, date: str):
-    # Query the collection for a document with the matching id
-    timer_document = collection_Timer.find_one({"id": user_id})
-    
+async def get_duration(user_id: str, date: str, db: Database = Depends(get_db)):
+    # Find the duration for the given date in the user's monthly bucket
+    duration = await timer_store.get_day(db, user_id, date)
+    if duration is not None:
+        return {"duration": duration}
+
     # If the document is not found, return an error response
-    if not timer_document:
+    if not await db.Timer.find_one({"id": user_id}, {"_id": 1}):
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Extract the durations array
-    durations = timer_document.get("dates", [])
-    
-    # Find the duration for the given date
-    for duration_entry in durations:
-        if duration_entry['date'] == date:
-            return {"duration": duration_entry['duration']}
-    
     # If the date is not found, return an error response
     raise HTTPException(status_code=404, detail="Date not found for this user")
 
@@ -70,6 +51,7 @@ class TimerGroupRequestModel(BaseModel):
 
 class TimerGroupResponseModel(BaseModel):
     members: list[MemberTimerInfoModel]
+    missing: int = 0  # members with no timer data for the date
 
 
 def get_duration(date_info, request_date):
@@ -82,112 +64,153 @@ def get_duration(date_info, request_date):
     # Return 0 as a default value if there is no match or the keys don't exist
     return 0
 
-@timer.post('/group', response_model=TimerGroupResponseModel)
-async def get_timer_info_for_group(timer_group_request: TimerGroupRequestModel):
+# Timer state of every member plus their duration on `date`, in one round
+# trip: the day is read from the member's monthly bucket, or from the legacy
+# `dates` array (filtered down to that one entry) for users not migrated yet.
+def group_timer_pipeline(member_ids: list, date: str) -> list:
+    timer_store.check_date(date)
+    return [
+        {"$match": {"id": {"$in": member_ids}}},
+        {"$lookup": {
+            "from": "TimerBucket",
+            "let": {"member_id": "$id"},
+            "pipeline": [
+                {"$match": {"month": timer_store.month_of(date), "$expr": {"$eq": ["$id", "$$member_id"]}}},
+                {"$project": {"_id": 0, "duration": f"$days.{date}"}},
+            ],
+            "as": "bucket",
+        }},
+        {"$project": {
+            "_id": 0,
+            "id": 1,
+            "nickname": 1,
+            "total": 1,
+            "isStudy": 1,
+            "recent": 1,
+            "bucket": {"$arrayElemAt": ["$bucket.duration", 0]},
+            "legacy": {"$filter": {
+                "input": {"$ifNull": ["$dates", []]},
+                "as": "entry",
+                "cond": {"$eq": ["$$entry.date", date]},
+            }},
+        }},
+    ]
+
+
+# The /timer/group payload as plain dicts (shaped like TimerGroupResponseModel)
+async def group_timer_snapshot(db: Database, presence: PresenceRegistry, group_name: str, date: str) -> dict:
     # Find the group by name
-    group_data = collection_Group.find_one({"group_name": timer_group_request.group_name})
+    group_data = await db.Group.find_one({"group_name": group_name}, {"_id": 0, "members": 1})
     if not group_data:
-        raise HTTPException(status_code=Stats.HTTP_404_NOT_FOUND, detail="Group not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
 
     # Retrieve member IDs from the group
     member_ids = group_data.get('members', [])
 
-    # Get timer info for each member for the specified date
+    timers = {}
+    async for timer_data in db.Timer.aggregate(group_timer_pipeline(member_ids, date)):
+        # isStudy changes made in this worker may not be flushed yet
+        presence.overlay(timer_data)
+        timers[timer_data["id"]] = timer_data
+
+    # Build timer info for each member for the specified date, in membership order
     member_timer_infos = []
     for member_id in member_ids:
-        timer_data = collection_Timer.find_one({"id": member_id, "dates.date": timer_group_request.date})
-        if timer_data:
-            dates_info = [
-                {
-                    "date": date_info['date'],
-                    "duration": date_info['duration']
-                }
-                for date_info in timer_data.get('dates', [])
-                if date_info['date'] == timer_group_request.date
-            ]
-
-            is_study = timer_data.get('isStudy', False)
-            nickname_ = timer_data["nickname"]  # Get isStudy status
-
-            # Handle the recent field
-            recent = timer_data.get('recent')
-            recent_dict = {"timestamp": recent.time} if isinstance(recent, Timestamp) else {}
-
-            # Create the MemberTimerInfoModel object
-            member_timer_info = MemberTimerInfoModel(
-                id=member_id,
-                total=timer_data.get('total', 0),
-                recent=recent_dict,
-                dates=dates_info,
-                isStudy=is_study,
-                nickname=nickname_ # Include isStudy status
-            )
-            member_timer_infos.append(member_timer_info)
-
-    return TimerGroupResponseModel(members=member_timer_infos)
-
-
-
-
-
-
+        timer_data = timers.get(member_id)
+        if not timer_data:
+            continue
+        duration = timer_data.get("bucket")
+        if duration is None and timer_data["legacy"]:
+            duration = int(timer_data["legacy"][0].get("duration", 0))
+        if duration is None:
+            continue
+        dates_info = [
+            {
+                "date": date,
+                "duration": duration
+            }
+        ]
+
+        is_study = timer_data.get('isStudy', False)
+        nickname_ = timer_data["nickname"]  # Get isStudy status
+
+        # Handle the recent field
+        recent = timer_data.get('recent')
+        recent_dict = {"timestamp": recent.time} if isinstance(recent, Timestamp) else {}
+
+        # Same fields as MemberTimerInfoModel, without validating our own data
+        member_timer_info = {
+            "id": member_id,
+            "nickname": nickname_,
+            "total": timer_data.get('total', 0),
+            "isStudy": is_study,
+            "recent": recent_dict,
+            "dates": dates_info,
+        }
+        member_timer_infos.append(member_timer_info)
+
+    return {
+        "members": member_timer_infos,
+        "missing": len(member_ids) - len(member_timer_infos),
+    }
 
 
-
-
-
-# timer_sio = socketio.AsyncServer(cors_allowed_origins='*')
-# timer_socket_app = socketio.ASGIApp(timer_sio)
-
-# # Define Socket.IO event handlers
-# @timer_sio.event
-# async def connect(sid, environ):
-#     print("Client connected", sid)
-
-# @timer_sio.event
-# async def disconnect(sid):
-#     print("Client disconnected", sid)
-
-# @timer_sio.event
-# async def timer_action(sid, data):
-#     user_id = data['id']
-#     action = data['action']
-
-#     if action == 'start':
-#         await collection_Timer.update_one(
-#             {"id": user_id},
-#             {"$set": {"isStudy": True, "recent": datetime.utcnow()}}
-#         )
-#         await timer_sio.emit('timer_started', {'id': user_id}, to=sid)
-
-#     elif action == 'stop':
-#         timer_data = await collection_Timer.find_one({"id": user_id})
-#         if timer_data:
-#             previous_recent = timer_data.get("recent", datetime.utcnow())
-#         else:
-#             previous_recent = datetime.utcnow()
-
-#         # Calculate the time difference
-#         time_difference = datetime.utcnow() - previous_recent
-
-#         # Update the user's 'isStudy' status and add the time difference
-#         await collection_Timer.update_one(
-#             {"id": user_id},
-#             {
-#                 "$set": {"isStudy": False, "recent": datetime.utcnow()},
-#                 "$inc": {"duration": time_difference.total_seconds()}
-#             }
-#         )
-#         await timer_sio.emit('timer_stopped', {'id': user_id}, to=sid)
-
-# # Create WebSocket route for /timer
-# @timer.websocket("/ws")
-# async def websocket_endpoint(websocket: WebSocket):
-#     await websocket.accept()
-#     while True:
-#         data = await websocket.receive_text()
-#         await websocket.send_text(f"Message text was: {data}")
-
-
-# from fastapi import HTTPException
-
+@timer.post('/group', response_model=TimerGroupResponseModel)
+async def get_timer_info_for_group(
+    timer_group_request: TimerGroupRequestModel,
+    db: Database = Depends(get_db),
+    presence: PresenceRegistry = Depends(get_presence),
+):
+    return MongoJSONResponse(
+        await group_timer_snapshot(db, presence, timer_group_request.group_name, timer_group_request.date)
+    )
+
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    # Clients don't send anything; reading is only how we learn they left
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+# Push channel replacing /timer/group polling. Connect to
+# /timer/ws?group_name=...&date=... and receive one
+# {"type": "snapshot", "members": [...], "missing": n} message followed by a
+# {"type": "start" | "stop", "id", "isStudy", "date", "duration"} message
+# whenever a member starts or stops their timer.
+@timer.websocket("/ws")
+async def timer_websocket(websocket: WebSocket, group_name: str, date: str):
+    db: Database = websocket.app.state.db
+    broadcast: MemoryBroadcast = websocket.app.state.broadcast
+
+    try:
+        timer_store.check_date(date)
+    except timer_store.InvalidDate as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+        return
+    group_data = await db.Group.find_one({"group_name": group_name}, {"_id": 0, "members": 1})
+    if not group_data:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Group not found")
+        return
+    await websocket.accept()
+
+    # Subscribe before taking the snapshot so no transition in between is lost
+    async with broadcast.subscribe(timer_channel(member_id) for member_id in group_data.get('members', [])) as events:
+        snapshot = await group_timer_snapshot(db, websocket.app.state.presence, group_name, date)
+        await websocket.send_json({"type": "snapshot", **snapshot})
+
+        disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+        try:
+            while True:
+                event = asyncio.create_task(events.get())
+                done, _ = await asyncio.wait({event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if event not in done:
+                    event.cancel()
+                    break
+                await websocket.send_json(event.result())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            disconnected.cancel()
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import Request
+
+from src import config
+from src.db import Database
+from src.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+broadcast_subscribers = Gauge("broadcast_subscribers", "Open presence subscriptions in this worker")
+broadcast_dropped = Counter("broadcast_dropped_total", "Presence events dropped because a subscriber fell behind")
+
+
+def timer_channel(user_id: str) -> str:
+    return f"timer:{user_id}"
+
+
+# Fan-out inside one process. Every subscriber gets a bounded queue; one that
+# falls behind loses its oldest events rather than slowing down publishers.
+class MemoryBroadcast:
+    def __init__(self, queue_size: int = config.BROADCAST_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, channel: str, message: dict):
+        self.deliver(channel, message)
+
+    def deliver(self, channel: str, message: dict):
+        for queue in self._subscribers.get(channel, ()):
+            if queue.full():
+                queue.get_nowait()
+                broadcast_dropped.inc()
+            queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channels: Iterable[str], queue_size: Optional[int] = None):
+        # queue_size=0 is unbounded, for internal consumers that must not lose events
+        channels = list(channels)
+        queue = asyncio.Queue(self.queue_size if queue_size is None else queue_size)
+        for channel in channels:
+            self._subscribers[channel].add(queue)
+        broadcast_subscribers.inc()
+        try:
+            yield queue
+        finally:
+            for channel in channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(queue)
+                    if not subscribers:
+                        del self._subscribers[channel]
+            broadcast_subscribers.dec()
+
+
+# Fan-out across workers: publish() inserts into PresenceEvent and every
+# worker follows that collection with a change stream, delivering to its own
+# subscribers. Change streams need a replica set (Atlas always is). Events
+# published while a worker is reconnecting are not replayed; clients get a
+# fresh snapshot whenever they (re)subscribe.
+class MongoBroadcast(MemoryBroadcast):
+    def __init__(self, db: Database, queue_size: int = config.BROADCAST_QUEUE_SIZE):
+        super().__init__(queue_size)
+        self.db = db
+        self._watcher = None
+
+    async def start(self):
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._watcher
+
+    async def publish(self, channel: str, message: dict):
+        await self.db.PresenceEvent.insert_one({"channel": channel, "message": message, "createdAt": datetime.utcnow()})
+
+    async def _watch(self):
+        while True:
+            try:
+                async with self.db.PresenceEvent.watch([{"$match": {"operationType": "insert"}}]) as stream:
+                    async for change in stream:
+                        event = change["fullDocument"]
+                        self.deliver(event["channel"], event["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Presence change stream failed; reconnecting")
+                await asyncio.sleep(1)
+
+
+def create_broadcast(db: Database):
+    if config.BROADCAST_BACKEND == "mongo":
+        return MongoBroadcast(db)
+    return MemoryBroadcast()
+
+
+# FastAPI dependency
+def get_broadcast(request: Request) -> MemoryBroadcast:
+    return request.app.state.broadcast
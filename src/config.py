@@ -0,0 +1,67 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# MongoDB
+CLIENT = os.environ.get("CLIENT")
+DB_NAME = os.environ.get("DB_NAME", "MadCampWeek3")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+DB_COMMAND_BUDGET = int(os.environ.get("DB_COMMAND_BUDGET", 20))  # per request, warns above
+DB_STATS_HEADERS = os.environ.get("DB_STATS_HEADERS", "0") == "1"  # debug: X-DB-* response headers and reply byte counts
+
+# solved.ac
+SOLVEDAC_BASE_URL = os.environ.get("SOLVEDAC_BASE_URL", "https://solved.ac/api/v3")
+SOLVEDAC_TIMEOUT = float(os.environ.get("SOLVEDAC_TIMEOUT", 5.0))
+SOLVEDAC_CONNECT_TIMEOUT = float(os.environ.get("SOLVEDAC_CONNECT_TIMEOUT", 3.0))
+SOLVEDAC_MAX_CONNECTIONS = int(os.environ.get("SOLVEDAC_MAX_CONNECTIONS", 20))
+SOLVEDAC_CACHE_TTL = float(os.environ.get("SOLVEDAC_CACHE_TTL", 60))
+SOLVEDAC_CACHE_SIZE = int(os.environ.get("SOLVEDAC_CACHE_SIZE", 2048))
+PROFILE_REFRESH_TTL = float(os.environ.get("PROFILE_REFRESH_TTL", 600))  # age before /login refreshes an Info profile
+
+# Password hashing
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Schema
+SCHEMA_ENSURE_INDEXES = os.environ.get("SCHEMA_ENSURE_INDEXES", "1") == "1"
+
+# Problem catalog ingestion
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 500))
+INGEST_QUEUE_PAGES = int(os.environ.get("INGEST_QUEUE_PAGES", 4))
+INGEST_ADMIN_TOKEN = os.environ.get("INGEST_ADMIN_TOKEN")  # unset: POST /problems/ingest is off, use python -m src.ingest
+
+# Recommendation index
+PROBLEM_INDEX_REFRESH_SECONDS = float(os.environ.get("PROBLEM_INDEX_REFRESH_SECONDS", 60))
+SOLVED_CACHE_SIZE = int(os.environ.get("SOLVED_CACHE_SIZE", 1000))
+SOLVED_CACHE_TTL = float(os.environ.get("SOLVED_CACHE_TTL", 3600))
+SOLVED_MAX_PAGES = int(os.environ.get("SOLVED_MAX_PAGES", 20))
+SOLVED_FILL_TIMEOUT = float(os.environ.get("SOLVED_FILL_TIMEOUT", 2.0))  # wait for a never-fetched handle's solves
+SOLVED_MAX_PROBLEM_ID = int(os.environ.get("SOLVED_MAX_PROBLEM_ID", 200000))  # larger ids are ignored; bounds a bitmap at ~25KB
+
+# LLM tips
+TIP_MODEL = os.environ.get("TIP_MODEL", "gpt-4")
+TIP_CACHE_SIZE = int(os.environ.get("TIP_CACHE_SIZE", 512))
+TIP_CACHE_TTL = float(os.environ.get("TIP_CACHE_TTL", 7 * 24 * 3600))
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openai")  # openai | stub
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", 32))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", 30))
+LLM_STUB_LATENCY = float(os.environ.get("LLM_STUB_LATENCY", 0.5))
+LLM_STUB_TOKENS = int(os.environ.get("LLM_STUB_TOKENS", 120))
+LLM_STUB_TOKEN_DELAY = float(os.environ.get("LLM_STUB_TOKEN_DELAY", 0.01))
+
+# Presence push
+BROADCAST_BACKEND = os.environ.get("BROADCAST_BACKEND", "memory")  # memory | mongo
+BROADCAST_QUEUE_SIZE = int(os.environ.get("BROADCAST_QUEUE_SIZE", 100))
+BROADCAST_EVENT_TTL = int(os.environ.get("BROADCAST_EVENT_TTL", 3600))
+
+# Timer presence (write-behind)
+PRESENCE_FLUSH_INTERVAL = float(os.environ.get("PRESENCE_FLUSH_INTERVAL", 2))
+PRESENCE_IDLE_SECONDS = float(os.environ.get("PRESENCE_IDLE_SECONDS", 24 * 3600))
+
+# Leaderboards
+LEADERBOARD_CACHE_SIZE = int(os.environ.get("LEADERBOARD_CACHE_SIZE", 1000))
+LEADERBOARD_TTL = float(os.environ.get("LEADERBOARD_TTL", 600))  # safety-net rebuild; changes are shared through the broadcast backend
@@ -0,0 +1,97 @@
+import threading
+import time
+
+from fastapi import Request
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from src import config
+from src.dbstats import CommandStatsListener
+from src.metrics import Counter, Gauge, Histogram
+
+pool_checkout_seconds = Histogram(
+    "mongo_pool_checkout_seconds", "Time spent waiting for a pooled Mongo connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+pool_checkout_failures = Counter("mongo_pool_checkout_failures_total", "Failed Mongo connection checkouts", ["reason"])
+pool_checked_out = Gauge("mongo_pool_checked_out", "Mongo connections currently checked out of the pool")
+
+
+# One Motor client (and so one connection pool) per worker process.
+# Created in the app lifespan and handed to routers through `get_db`.
+class Database:
+    def __init__(self, client: AsyncIOMotorClient, name: str = config.DB_NAME):
+        self.client = client
+        self.db = client[name]
+        self.User = self.db['User']
+        self.Info = self.db['Info']
+        self.Group = self.db['Group']
+        self.Timer = self.db['Timer']
+        self.TimerBucket = self.db['TimerBucket']
+        self.Problems = self.db['Problems']
+        self.Tip = self.db['Tip']
+        self.IngestCheckpoint = self.db['IngestCheckpoint']
+        self.StudyRollup = self.db['StudyRollup']
+        self.PresenceEvent = self.db['PresenceEvent']
+        self.SolvedProblems = self.db['SolvedProblems']
+
+    def close(self):
+        self.client.close()
+
+
+# Pool checkouts happen synchronously on Motor's executor threads, so the
+# start time is kept per thread and read back when the checkout completes
+class PoolWaitListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            pool_checkout_seconds.observe(time.perf_counter() - started)
+        pool_checked_out.inc()
+
+    def connection_check_out_failed(self, event):
+        pool_checkout_failures.inc(labels=(event.reason,))
+
+    def connection_checked_in(self, event):
+        pool_checked_out.dec()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+
+def connect(uri: str = None) -> Database:
+    client = AsyncIOMotorClient(
+        uri or config.CLIENT,
+        maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+        minPoolSize=config.MONGO_MIN_POOL_SIZE,
+        event_listeners=[CommandStatsListener(), PoolWaitListener()],
+    )
+    return Database(client)
+
+
+# FastAPI dependency
+def get_db(request: Request) -> Database:
+    return request.app.state.db
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Awaitable, Callable, Dict, Optional
+
+import bson
+from pymongo import monitoring
+
+from src import config
+from src.http_metrics import route_label
+from src.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+request_db_commands = Histogram(
+    "http_request_db_commands", "Mongo commands issued per request", ["route"],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+request_db_seconds = Histogram("http_request_db_seconds", "Time spent in Mongo commands per request", ["route"])
+request_db_bytes = Histogram(
+    "http_request_db_bytes", "BSON bytes returned by Mongo per request (debug mode only)", ["route"],
+    buckets=(1e3, 1e4, 1e5, 1e6, 1e7),
+)
+request_db_over_budget = Counter(
+    "http_request_db_over_budget_total", "Requests that issued more than DB_COMMAND_BUDGET Mongo commands", ["route"]
+)
+
+
+# Mongo work attributed to one request (or one tracking() block).
+# Commands are recorded on Motor's executor threads, which run with a copy
+# of the caller's context, so they land on the stats object of the request
+# that awaited them. Scopes nest: a command also counts towards every
+# enclosing scope.
+class DBStats:
+    def __init__(self, parent: Optional["DBStats"] = None):
+        self.parent = parent
+        self.commands = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.by_command: Dict[str, int] = {}
+
+    def record(self, command_name: str, seconds: float, size: int):
+        stats = self
+        while stats is not None:
+            stats.commands += 1
+            stats.seconds += seconds
+            stats.bytes += size
+            stats.by_command[command_name] = stats.by_command.get(command_name, 0) + 1
+            stats = stats.parent
+
+
+_current: ContextVar[Optional[DBStats]] = ContextVar("db_stats", default=None)
+
+
+def current() -> Optional[DBStats]:
+    return _current.get()
+
+
+@contextmanager
+def tracking():
+    stats = DBStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def untracked_task(fn: Callable[..., Awaitable], *args) -> asyncio.Future:
+    # ensure_future(fn(*args)) for work that isn't the current request's
+    # own: a flight shared by several requests, a refresh left running after
+    # the response. Tasks (and Motor calls) copy the context they're started
+    # in, so without this the first caller would be billed for all of it,
+    # even after it has finished.
+    context = copy_context()
+    context.run(_current.set, None)
+    return context.run(lambda: asyncio.ensure_future(fn(*args)))
+
+
+@contextmanager
+def expect_max_commands(limit: int):
+    # For tests: fail when the block (e.g. one request through the app's
+    # ASGI transport) issues more than `limit` Mongo commands
+    #
+    #   with dbstats.expect_max_commands(3):
+    #       await client.post("/group/member", json={"group_name": "g"})
+    with tracking() as stats:
+        yield stats
+    if stats.commands > limit:
+        raise AssertionError(f"{stats.commands} Mongo commands, expected at most {limit}: {stats.by_command}")
+
+
+# Registered on the Motor client in src.db.connect. Commands issued outside
+# any scope are not attributed to a request: startup, the lifespan's loops,
+# and everything run with untracked_task. Replies reach listeners
+# already decoded, so measuring them means re-encoding every batch: bytes
+# are only counted in debug mode (DB_STATS_HEADERS), and are 0 otherwise.
+class CommandStatsListener(monitoring.CommandListener):
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        stats = _current.get()
+        if stats is not None:
+            size = len(bson.encode(event.reply)) if config.DB_STATS_HEADERS else 0
+            stats.record(event.command_name, event.duration_micros / 1e6, size)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        stats = _current.get()
+        if stats is not None:
+            stats.record(event.command_name, event.duration_micros / 1e6, 0)
+
+
+# Pure ASGI middleware opening a stats scope per HTTP request. With
+# DB_STATS_HEADERS on, the totals so far are also sent as X-DB-* response
+# headers (commands issued while a streaming body is sent are only in the
+# metrics).
+class DBStatsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with tracking() as stats:
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start" and config.DB_STATS_HEADERS:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-db-commands", str(stats.commands).encode()),
+                        (b"x-db-time-ms", f"{stats.seconds * 1000:.3f}".encode()),
+                        (b"x-db-bytes", str(stats.bytes).encode()),
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_headers)
+            finally:
+                _observe(scope, stats)
+
+
+def _observe(scope: dict, stats: DBStats):
+    path = route_label(scope)
+    request_db_commands.observe(stats.commands, (path,))
+    request_db_seconds.observe(stats.seconds, (path,))
+    if config.DB_STATS_HEADERS:
+        request_db_bytes.observe(stats.bytes, (path,))
+    if stats.commands > config.DB_COMMAND_BUDGET:
+        request_db_over_budget.inc(labels=(path,))
+        logger.warning(
+            "%s %s issued %d Mongo commands (budget %d): %s",
+            scope.get("method"), path, stats.commands, config.DB_COMMAND_BUDGET, stats.by_command,
+        )
@@ -0,0 +1,56 @@
+import time
+
+from src.metrics import Counter, Gauge, Histogram
+
+http_requests = Counter("http_requests_total", "HTTP requests handled", ["method", "route", "status"])
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending the last body chunk", ["method", "route"]
+)
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests being handled by this worker", ["method"])
+http_exceptions = Counter(
+    "http_request_exceptions_total", "Requests that raised instead of returning a response", ["method", "route"]
+)
+
+
+def route_label(scope: dict) -> str:
+    # The matched route's path template (set in the scope while routing), so
+    # every route is one series whatever its parameters; requests that
+    # matched no route share one series
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+# Pure ASGI middleware (no BaseHTTPMiddleware task/stream wrapping), added
+# outermost so its timings cover the whole stack. Per request it's a couple
+# of perf_counter calls and dict updates. The route is only known after
+# routing, so the in-flight gauge is per method; per-route concurrency is
+# the rate of http_request_duration_seconds_sum.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500  # until the app sends a response start
+        started = time.perf_counter()
+        http_in_flight.inc(labels=(method,))
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException:
+            http_exceptions.inc(labels=(method, route_label(scope)))
+            raise
+        finally:
+            route = route_label(scope)
+            http_in_flight.dec(labels=(method,))
+            http_request_seconds.observe(time.perf_counter() - started, (method, route))
+            http_requests.inc(labels=(method, route, str(status)))
@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from pymongo import UpdateOne
+
+from src import config
+from src.db import Database, connect
+from src.dbstats import untracked_task
+from src.solvedac import SolvedAcClient
+
+logger = logging.getLogger(__name__)
+
+# Problem catalog ingestion from solved.ac's problem search. Pages are
+# fetched by a producer task and streamed through a bounded queue to a
+# writer that upserts them with unordered bulk writes. After every batch the
+# last fully written page is stored in IngestCheckpoint, so an interrupted
+# run resumes where it stopped.
+
+PAGE_SIZE = 50  # fixed by solved.ac
+TIERS = "bsgpdr"
+
+_running: Set[str] = set()
+_tasks: Set[asyncio.Task] = set()
+
+
+def tier_name(level: int) -> str:
+    # 1 -> b5, 5 -> b1, 6 -> s5, ..., 30 -> r1
+    return f"{TIERS[(level - 1) // 5]}{5 - (level - 1) % 5}"
+
+
+def build_queries(tags: Iterable[str], level_min: int = 1, level_max: int = 30) -> List[str]:
+    tiers = f"tier:{tier_name(level_min)}..{tier_name(level_max)}"
+    tags = [tag for tag in tags if tag]
+    if not tags:
+        return [tiers]
+    return [f"{tiers} tag:{tag}" for tag in tags]
+
+
+def problem_document(item: dict) -> dict:
+    return {
+        'problemId': item['problemId'],
+        'titleKo': item['titleKo'],
+        'level': item['level'],
+        'key': item['tags'][0]['key'] if item['tags'] else None,
+    }
+
+
+async def upsert_problems(db: Database, problems: List[dict]) -> int:
+    if not problems:
+        return 0
+    now = datetime.utcnow()
+    result = await db.Problems.bulk_write(
+        [UpdateOne({'problemId': p['problemId']}, {'$set': {**p, 'updatedAt': now}}, upsert=True) for p in problems],
+        ordered=False,
+    )
+    return result.upserted_count + result.modified_count
+
+
+async def ingest_query(
+    db: Database,
+    solvedac: SolvedAcClient,
+    query: str,
+    restart: bool = False,
+    batch_size: int = config.INGEST_BATCH_SIZE,
+    queue_pages: int = config.INGEST_QUEUE_PAGES,
+) -> int:
+    checkpoint = None if restart else await db.IngestCheckpoint.find_one({"_id": query})
+    start = 1
+    if checkpoint:
+        # A finished query re-reads its last page to pick up newly added problems
+        start = checkpoint["page"] + (0 if checkpoint.get("done") else 1)
+    # A run whose first page came back empty checkpoints page 0
+    start = max(start, 1)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_pages)
+
+    async def produce():
+        page = start
+        try:
+            while True:
+                data = await solvedac.search_problems(query, page)
+                items = data.get("items", [])
+                if items:
+                    await queue.put((page, [problem_document(item) for item in items]))
+                if not items or page * PAGE_SIZE >= data.get("count", 0):
+                    await queue.put((page, "done"))
+                    return
+                page += 1
+        finally:
+            await queue.put(None)
+
+    async def flush(batch: List[dict], page: int, done: bool = False) -> int:
+        written = await upsert_problems(db, batch)
+        await db.IngestCheckpoint.update_one(
+            {"_id": query},
+            {"$set": {"page": page, "done": done, "updatedAt": datetime.utcnow()}, "$inc": {"written": written}},
+            upsert=True,
+        )
+        return written
+
+    producer = asyncio.create_task(produce())
+    written, batch, last_page = 0, [], start - 1
+    try:
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                break
+            page, problems = entry
+            if problems == "done":
+                written += await flush(batch, last_page, done=True)
+                batch = []
+                continue
+            batch.extend(problems)
+            last_page = page
+            # Batches always end on a page boundary so the checkpoint is exact
+            if len(batch) >= batch_size:
+                written += await flush(batch, last_page)
+                batch = []
+        if batch:
+            written += await flush(batch, last_page)
+        await producer
+    finally:
+        producer.cancel()
+    return written
+
+
+async def ingest(db: Database, solvedac: SolvedAcClient, queries: List[str], restart: bool = False) -> Dict[str, int]:
+    results = {}
+    for query in queries:
+        if query in _running:
+            continue
+        _running.add(query)
+        try:
+            results[query] = await ingest_query(db, solvedac, query, restart)
+            logger.info("Ingested %s problems for %r", results[query], query)
+        except Exception:
+            logger.exception("Problem ingestion failed for %r", query)
+        finally:
+            _running.discard(query)
+    return results
+
+
+def start_background(db: Database, solvedac: SolvedAcClient, queries: List[str], restart: bool = False) -> Optional[asyncio.Task]:
+    queries = [query for query in queries if query not in _running]
+    if not queries:
+        return None
+    task = untracked_task(ingest, db, solvedac, queries, restart)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+def is_running(query: str) -> bool:
+    return query in _running
+
+
+def any_running() -> bool:
+    return bool(_tasks)
+
+
+async def _main(args):
+    db = connect()
+    solvedac = SolvedAcClient()
+    try:
+        queries = build_queries(args.tags.split(",") if args.tags else [], *args.levels)
+        for query, written in (await ingest(db, solvedac, queries, args.restart)).items():
+            print(f"{query}: {written} problems written")
+    finally:
+        await solvedac.aclose()
+        db.close()
+
+
+def _levels(value: str):
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+if __name__ == "__main__":
+    # python -m src.ingest --tags dp,greedy --levels 1-30 [--restart]
+    parser = argparse.ArgumentParser(description="Load solved.ac problems into the Problems collection")
+    parser.add_argument("--tags", default="", help="comma separated solved.ac tag keys")
+    parser.add_argument("--levels", type=_levels, default=(1, 30), help="level range, e.g. 6-15")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,242 @@
+import logging
+import uuid
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import Request
+
+from src import config, rollup
+from src.broadcast import MemoryBroadcast
+from src.cache import SingleFlight, TTLCache
+from src.db import Database
+
+logger = logging.getLogger(__name__)
+
+
+# One group's ranking for one period, kept sorted by (-duration, seq, id).
+# `seq` is the order the member was added in (group membership order), so
+# ties rank the way the old aggregation did. Lookups are bisects; inserts and
+# removals bisect too and then shift the list (a memmove, cheap at group
+# sizes).
+class Leaderboard:
+    def __init__(self):
+        self._sorted: List[Tuple[int, int, str]] = []
+        self._entries: Dict[str, Tuple[int, int, str]] = {}
+        self._next_seq = 0
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def add(self, user_id: str, duration: int = 0):
+        if user_id in self._entries:
+            return
+        entry = (-duration, self._next_seq, user_id)
+        self._next_seq += 1
+        insort(self._sorted, entry)
+        self._entries[user_id] = entry
+
+    def remove(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            del self._sorted[bisect_left(self._sorted, entry)]
+
+    def increment(self, user_id: str, delta: int):
+        entry = self._entries.get(user_id)
+        if entry is None or delta == 0:
+            return
+        del self._sorted[bisect_left(self._sorted, entry)]
+        entry = (entry[0] - delta, entry[1], user_id)
+        insort(self._sorted, entry)
+        self._entries[user_id] = entry
+
+    def rank(self, user_id: str) -> Optional[int]:
+        # 1-based position, None for non-members
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return bisect_left(self._sorted, entry) + 1
+
+    def page(self, offset: int = 0, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        end = len(self._sorted) if limit is None else offset + limit
+        return [(user_id, -neg_duration) for neg_duration, _, user_id in self._sorted[offset:end]]
+
+    def around(self, user_id: str, radius: int) -> Tuple[Optional[int], List[Tuple[str, int]], int]:
+        # The member's rank, the rows from `radius` above to `radius` below
+        # them, and the rank of the first of those rows
+        rank = self.rank(user_id)
+        if rank is None:
+            return None, [], 0
+        start = max(rank - 1 - radius, 0)
+        return rank, self.page(start, rank - start + radius), start + 1
+
+
+LEADERBOARD_CHANNEL = "leaderboard"
+BUILD_ATTEMPTS = 3
+
+BoardKey = Tuple[str, str, str]  # (group_name, period, key)
+
+
+# Leaderboards per (group, period, key), built from StudyRollup the first
+# time they're read and then kept up to date in place by /stop and by every
+# write to a group's members (/signup, /group/create, /group/join,
+# /group/leave), so reads never re-sort the group. Membership writes must go
+# through join/leave, or boards (here and on the other workers) miss them
+# until they expire.
+#
+# Each worker applies its own changes and publishes them on the broadcast
+# backend (src/broadcast.py); the other workers drop the boards a change
+# touches and rebuild them from the rollups on the next read, which (unlike
+# replaying the delta) can't count a change their rebuild already read.
+# Across workers that takes BROADCAST_BACKEND=mongo; the `ttl` rebuild is
+# only a safety net for missed events.
+class LeaderboardStore:
+    def __init__(
+        self,
+        broadcast: Optional[MemoryBroadcast] = None,
+        maxsize: int = config.LEADERBOARD_CACHE_SIZE,
+        ttl: float = config.LEADERBOARD_TTL,
+    ):
+        self._boards = TTLCache(maxsize, ttl)
+        self._loading = SingleFlight()
+        self._broadcast = broadcast
+        self._origin = uuid.uuid4().hex
+        # Which boards may be cached, by (period, key) and by group, so a
+        # change only visits the boards it affects
+        self._by_period: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self._by_group: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+        # Changes seen while a board is being built, see _build
+        self._changes: Dict[BoardKey, int] = {}
+
+    async def get(self, db: Database, group_name: str, period: str, key: str) -> Optional[Leaderboard]:
+        # None when the group doesn't exist
+        board = self._boards.get((group_name, period, key))
+        if board is None:
+            board = await self._loading.do((group_name, period, key), lambda: self._build(db, group_name, period, key))
+        return board
+
+    async def _build(self, db: Database, group_name: str, period: str, key: str) -> Optional[Leaderboard]:
+        # A /stop, join or leave whose write lands after the reads below but
+        # which is applied before the board is cached would be lost, so any
+        # change to the board during the reads means reading again
+        board_key = (group_name, period, key)
+        for _ in range(BUILD_ATTEMPTS):
+            self._changes[board_key] = 0
+            try:
+                board = await self._read(db, group_name, period, key)
+                changed = self._changes[board_key]
+            finally:
+                del self._changes[board_key]
+            if board is None:
+                return None
+            if not changed:
+                self._boards.set(board_key, board)
+                self._by_period[(period, key)].add(group_name)
+                self._by_group[group_name].add((period, key))
+                return board
+        # Still changing: serve it this once, uncached
+        return board
+
+    async def _read(self, db: Database, group_name: str, period: str, key: str) -> Optional[Leaderboard]:
+        group = await db.Group.find_one({"group_name": group_name}, {"_id": 0, "members": 1})
+        if group is None:
+            return None
+        members = group.get("members", [])
+        durations = {}
+        async for doc in db.StudyRollup.find(
+            {"period": period, "key": key, "id": {"$in": members}}, {"_id": 0, "id": 1, "duration": 1}
+        ):
+            durations[doc["id"]] = doc["duration"]
+        board = Leaderboard()
+        for member_id in members:
+            board.add(member_id, durations.get(member_id, 0))
+        return board
+
+    def _cached(self, group_name: str, period: str, key: str) -> Optional[Leaderboard]:
+        board = self._boards.peek((group_name, period, key))
+        if board is None:
+            # Expired or evicted: drop it from the indexes
+            self._by_period[(period, key)].discard(group_name)
+            self._by_group[group_name].discard((period, key))
+        return board
+
+    # The cached boards a change affects. Both also mark builds of those
+    # boards that are in flight as changed.
+    def _period_boards(self, period: str, key: str) -> List[Tuple[str, Leaderboard]]:
+        for board_key in self._changes:
+            if board_key[1:] == (period, key):
+                self._changes[board_key] += 1
+        boards = [(name, self._cached(name, period, key)) for name in list(self._by_period.get((period, key), ()))]
+        return [(name, board) for name, board in boards if board is not None]
+
+    def _group_boards(self, group_name: str) -> List[Tuple[Tuple[str, str], Leaderboard]]:
+        for board_key in self._changes:
+            if board_key[0] == group_name:
+                self._changes[board_key] += 1
+        boards = [((period, key), self._cached(group_name, period, key)) for period, key in list(self._by_group.get(group_name, ()))]
+        return [(period_key, board) for period_key, board in boards if board is not None]
+
+    async def record(self, user_id: str, date: str, delta: int):
+        # Called by /stop with the same difference rollup.record_duration applied
+        for period, key in rollup.period_keys(date).items():
+            for _, board in self._period_boards(period, key):
+                board.increment(user_id, delta)
+        await self._publish({"op": "record", "id": user_id, "date": date})
+
+    async def join(self, db: Database, group_name: str, user_id: str):
+        boards = self._group_boards(group_name)
+        if boards:
+            durations = {}
+            async for doc in db.StudyRollup.find(
+                {"id": user_id, "$or": [{"period": period, "key": key} for (period, key), _ in boards]},
+                {"_id": 0, "period": 1, "key": 1, "duration": 1},
+            ):
+                durations[(doc["period"], doc["key"])] = doc["duration"]
+            for period_key, board in boards:
+                board.add(user_id, durations.get(period_key, 0))
+        await self._publish({"op": "members", "group_name": group_name})
+
+    async def leave(self, group_name: str, user_id: str):
+        for _, board in self._group_boards(group_name):
+            board.remove(user_id)
+        await self._publish({"op": "members", "group_name": group_name})
+
+    async def _publish(self, message: dict):
+        if self._broadcast is None:
+            return
+        try:
+            await self._broadcast.publish(LEADERBOARD_CHANNEL, {**message, "origin": self._origin})
+        except Exception:
+            # The other workers catch up with their next rebuild
+            logger.exception("Could not publish a leaderboard change")
+
+    def apply_remote(self, message: dict):
+        # Another worker's change: drop the boards it touches
+        if message.get("origin") == self._origin:
+            return
+        if message["op"] == "record":
+            for period, key in rollup.period_keys(message["date"]).items():
+                for name, board in self._period_boards(period, key):
+                    if message["id"] in board:
+                        self._boards.pop((name, period, key))
+        elif message["op"] == "members":
+            for (period, key), _ in self._group_boards(message["group_name"]):
+                self._boards.pop((message["group_name"], period, key))
+
+    async def run_sync(self):
+        # Started by the lifespan next to the broadcast backend
+        async with self._broadcast.subscribe([LEADERBOARD_CHANNEL], queue_size=0) as events:
+            while True:
+                message = await events.get()
+                try:
+                    self.apply_remote(message)
+                except Exception:
+                    logger.exception("Could not apply leaderboard change %r", message)
+
+
+# FastAPI dependency
+def get_leaderboards(request: Request) -> LeaderboardStore:
+    return request.app.state.leaderboards
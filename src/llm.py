@@ -0,0 +1,165 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Tuple
+
+from fastapi import Request
+
+from src import config
+from src.metrics import Counter, Gauge, Histogram
+
+llm_in_flight = Gauge("llm_in_flight", "LLM generations currently running")
+llm_waiting = Gauge("llm_waiting", "LLM generations waiting for a slot")
+llm_rejected = Counter("llm_rejected_total", "LLM generations rejected because the queue was full")
+llm_queue_seconds = Histogram("llm_queue_wait_seconds", "Time LLM generations waited for a slot")
+llm_seconds = Histogram(
+    "llm_request_seconds", "LLM call latency once a slot is held (whole stream for streams)", ["op"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+
+
+class LLMOverloaded(Exception):
+    pass
+
+
+Messages = List[Tuple[str, str]]  # (role, text), role is "system" or "human"
+
+
+# LangChain, langchain_openai, openai and tiktoken take seconds and tens of
+# MB to import, so they're only loaded by the first generation, not by
+# every worker at startup.
+class OpenAIBackend:
+    def __init__(self, model: str = config.TIP_MODEL, temperature: float = 0.1):
+        self.version = model
+        self.temperature = temperature
+        self._client = None
+
+    def _chat(self):
+        # One client (and so one HTTP connection pool) for every generation
+        if self._client is None:
+            from langchain_openai import ChatOpenAI
+
+            self._client = ChatOpenAI(temperature=self.temperature, model_name=self.version, streaming=True)
+        return self._client
+
+    @staticmethod
+    def _messages(messages: Messages) -> List:
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        types = {"system": SystemMessage, "human": HumanMessage}
+        return [types[role](content=text) for role, text in messages]
+
+    async def generate(self, messages: Messages) -> str:
+        return (await self._chat().ainvoke(self._messages(messages))).content
+
+    async def stream(self, messages: Messages) -> AsyncIterator[str]:
+        async for chunk in self._chat().astream(self._messages(messages)):
+            if chunk.content:
+                yield chunk.content
+
+
+# Offline backend for local benchmarks and tests: no network, fixed-size
+# answers after a configurable delay.
+class StubBackend:
+    version = "stub"
+
+    def __init__(
+        self,
+        latency: float = config.LLM_STUB_LATENCY,
+        tokens: int = config.LLM_STUB_TOKENS,
+        token_delay: float = config.LLM_STUB_TOKEN_DELAY,
+    ):
+        self.latency = latency
+        self.tokens = tokens
+        self.token_delay = token_delay
+
+    def _tokens(self, messages: Messages):
+        prompt = messages[-1][1] if messages else ""
+        yield f"stub tip for: {prompt}\n"
+        for i in range(self.tokens):
+            yield f"step{i} "
+
+    async def generate(self, messages: Messages) -> str:
+        await asyncio.sleep(self.latency + self.tokens * self.token_delay)
+        return "".join(self._tokens(messages))
+
+    async def stream(self, messages: Messages) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(messages):
+            yield token
+            await asyncio.sleep(self.token_delay)
+
+
+BACKENDS = {"openai": OpenAIBackend, "stub": StubBackend}
+
+
+# Runs every LLM call on the event loop (ainvoke/astream) with at most
+# `max_concurrency` generations at once. Up to `max_queue` more wait for a
+# slot (for at most `queue_timeout` seconds); anything beyond that is shed
+# with LLMOverloaded, which the routers turn into a 503.
+class LLMExecutor:
+    def __init__(
+        self,
+        backend,
+        max_concurrency: int = config.LLM_MAX_CONCURRENCY,
+        max_queue: int = config.LLM_MAX_QUEUE,
+        queue_timeout: float = config.LLM_QUEUE_TIMEOUT,
+    ):
+        self.backend = backend
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+
+    @classmethod
+    def from_config(cls) -> "LLMExecutor":
+        return cls(BACKENDS[config.LLM_BACKEND]())
+
+    def saturated(self) -> bool:
+        return self._semaphore.locked() and self._waiting >= self.max_queue
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.saturated():
+            llm_rejected.inc()
+            raise LLMOverloaded("Too many tip requests in progress, try again shortly.")
+        self._waiting += 1
+        llm_waiting.inc()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            llm_rejected.inc()
+            raise LLMOverloaded("Timed out waiting for a free tip generator.")
+        finally:
+            self._waiting -= 1
+            llm_waiting.dec()
+            llm_queue_seconds.observe(time.perf_counter() - started)
+        llm_in_flight.inc()
+        try:
+            yield
+        finally:
+            llm_in_flight.dec()
+            self._semaphore.release()
+
+    async def generate(self, messages: Messages) -> str:
+        async with self.slot():
+            started = time.perf_counter()
+            try:
+                return await self.backend.generate(messages)
+            finally:
+                llm_seconds.observe(time.perf_counter() - started, ("generate",))
+
+    async def stream(self, messages: Messages) -> AsyncIterator[str]:
+        async with self.slot():
+            started = time.perf_counter()
+            try:
+                async for token in self.backend.stream(messages):
+                    yield token
+            finally:
+                llm_seconds.observe(time.perf_counter() - started, ("stream",))
+
+
+# FastAPI dependency
+def get_llm(request: Request) -> LLMExecutor:
+    return request.app.state.llm
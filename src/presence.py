@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from fastapi import Request
+from pymongo import ReturnDocument, UpdateOne
+
+from src import config, timer_store
+from src.db import Database
+from src.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+presence_sessions = Gauge("presence_sessions", "Users whose timer state is held in this worker")
+presence_dirty = Gauge("presence_dirty", "Timer state changes not yet written to Mongo")
+presence_flush_failures = Counter("presence_flush_failures_total", "Failed write-behind flushes of timer state")
+
+
+# Write-behind cache of the Timer state (isStudy, recent) of users this
+# worker has seen. /start and /stop update it in memory and a background task
+# writes the changes to Timer in one bulk write every `flush_interval`
+# seconds, and once more on shutdown.
+#
+# Durability: a crash loses at most the last `flush_interval` seconds of
+# isStudy/recent changes. Study durations are not affected: the day entries
+# and rollups are still written before /start and /stop return.
+#
+# With several workers each has its own registry. A flush only overwrites
+# Timer when its `recent` is newer than the stored one, so a late flush from
+# one worker never undoes a newer start/stop handled by another.
+class PresenceRegistry:
+    def __init__(
+        self,
+        flush_interval: float = config.PRESENCE_FLUSH_INTERVAL,
+        idle_seconds: float = config.PRESENCE_IDLE_SECONDS,
+    ):
+        self.flush_interval = flush_interval
+        self.idle_seconds = idle_seconds
+        # user id -> {"isStudy", "recent", "touched"}; only users whose Timer
+        # document exists and is migrated to buckets
+        self._sessions: Dict[str, dict] = {}
+        self._dirty: Set[str] = set()
+
+    def get(self, user_id: str) -> Optional[dict]:
+        return self._sessions.get(user_id)
+
+    async def load(self, db: Database, user_id: str, create: bool = False) -> Optional[dict]:
+        # None when the user has never had a timer (and create is False)
+        session = self._sessions.get(user_id)
+        if session is not None:
+            return session
+        if create:
+            timer_data = await db.Timer.find_one_and_update(
+                {"id": user_id},
+                {"$setOnInsert": {"bucketed": True}},
+                projection={"_id": 0, "bucketed": 1, "isStudy": 1, "recent": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        else:
+            timer_data = await db.Timer.find_one({"id": user_id}, {"_id": 0, "bucketed": 1, "isStudy": 1, "recent": 1})
+            if timer_data is None:
+                return None
+        await timer_store.ensure_migrated(db, timer_data, user_id)
+        # A concurrent request may have loaded the same user meanwhile
+        session = self._sessions.setdefault(
+            user_id, {"isStudy": timer_data.get("isStudy", False), "recent": timer_data.get("recent"), "touched": 0.0}
+        )
+        presence_sessions.set(len(self._sessions))
+        return session
+
+    def _update(self, user_id: str, session: dict, is_study: bool):
+        session["isStudy"] = is_study
+        session["recent"] = datetime.utcnow()
+        session["touched"] = time.monotonic()
+        self._dirty.add(user_id)
+        presence_dirty.set(len(self._dirty))
+
+    async def start(self, db: Database, user_id: str):
+        # Creates the Timer document the first time a user starts a timer
+        session = await self.load(db, user_id, create=True)
+        self._update(user_id, session, True)
+
+    async def stop(self, db: Database, user_id: str) -> bool:
+        # False when the user has never had a timer
+        session = await self.load(db, user_id)
+        if session is None:
+            return False
+        self._update(user_id, session, False)
+        return True
+
+    def overlay(self, timer_data: dict):
+        # Apply this worker's state to a Timer document read from Mongo,
+        # unless the stored one is newer (written by another worker)
+        session = self._sessions.get(timer_data.get("id"))
+        if session is None or session["recent"] is None:
+            return
+        stored = timer_data.get("recent")
+        if isinstance(stored, datetime) and stored > session["recent"]:
+            return
+        timer_data["isStudy"] = session["isStudy"]
+        timer_data["recent"] = session["recent"]
+
+    async def flush(self, db: Database):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        ops = []
+        for user_id in dirty:
+            session = self._sessions[user_id]
+            ops.append(UpdateOne(
+                {"id": user_id, "$or": [{"recent": None}, {"recent": {"$lt": session["recent"]}}]},
+                {"$set": {"isStudy": session["isStudy"], "recent": session["recent"]}},
+            ))
+        try:
+            await db.Timer.bulk_write(ops, ordered=False)
+        except BaseException as e:
+            # Retry with the next flush (the writes are idempotent). Also on
+            # cancellation: the shutdown flush then picks these users up.
+            self._dirty |= dirty
+            if isinstance(e, Exception):
+                presence_flush_failures.inc()
+            raise
+        finally:
+            presence_dirty.set(len(self._dirty))
+        self._evict_idle()
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for user_id in [u for u, s in self._sessions.items() if s["touched"] < cutoff and u not in self._dirty]:
+            del self._sessions[user_id]
+        presence_sessions.set(len(self._sessions))
+
+    async def run_flush(self, db: Database):
+        # Cancelled on shutdown, after which the lifespan calls flush() once more
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush(db)
+            except Exception:
+                logger.exception("Timer state flush failed; retrying in %ss", self.flush_interval)
+
+
+# FastAPI dependency
+def get_presence(request: Request) -> PresenceRegistry:
+    return request.app.state.presence
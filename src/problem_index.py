@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import random
+from bisect import bisect_right
+from datetime import datetime
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import Request
+
+from src import config
+from src.db import Database
+from src.solved import SolvedSet
+
+logger = logging.getLogger(__name__)
+
+PROJECTION = {"_id": 0, "problemId": 1, "titleKo": 1, "level": 1, "key": 1, "updatedAt": 1}
+
+
+# Process-local copy of the problem catalog bucketed by (tag, level), so
+# /recommend/list can sample candidates without a Mongo round trip. It is
+# loaded once at startup and then kept fresh by polling for documents whose
+# updatedAt moved (the ingester and /problem/{problemId} set it).
+class ProblemIndex:
+    def __init__(self):
+        self._buckets: Dict[Tuple[Optional[str], int], List[dict]] = {}
+        self._placement: Dict[int, Tuple[Optional[str], int]] = {}
+        # Lazily built problemId arrays per bucket, for vectorised filtering
+        self._id_arrays: Dict[Tuple[Optional[str], int], np.ndarray] = {}
+        self._last_update: Optional[datetime] = None
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._placement)
+
+    def add(self, problem: dict):
+        problem_id = problem["problemId"]
+        bucket_key = (problem.get("key"), problem.get("level"))
+        entry = {
+            "problemId": problem_id,
+            "titleKo": problem.get("titleKo"),
+            "level": problem.get("level"),
+            "key": problem.get("key"),
+        }
+        previous = self._placement.get(problem_id)
+        if previous is not None:
+            bucket = self._buckets[previous]
+            bucket[:] = [p for p in bucket if p["problemId"] != problem_id]
+            self._id_arrays.pop(previous, None)
+        self._buckets.setdefault(bucket_key, []).append(entry)
+        self._id_arrays.pop(bucket_key, None)
+        self._placement[problem_id] = bucket_key
+        updated_at = problem.get("updatedAt")
+        if updated_at is not None and (self._last_update is None or updated_at > self._last_update):
+            self._last_update = updated_at
+
+    async def load(self, db: Database):
+        async for problem in db.Problems.find({}, PROJECTION):
+            self.add(problem)
+        self.loaded = True
+        logger.info("Problem index loaded with %d problems", len(self))
+
+    async def refresh(self, db: Database) -> int:
+        # $gte because several workers stamp updatedAt; re-adding is idempotent
+        query = {"updatedAt": {"$gte": self._last_update}} if self._last_update else {"updatedAt": {"$exists": True}}
+        count = 0
+        async for problem in db.Problems.find(query, PROJECTION):
+            self.add(problem)
+            count += 1
+        return count
+
+    async def run_refresh(self, db: Database, interval: float = config.PROBLEM_INDEX_REFRESH_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not self.loaded:
+                    await self.load(db)
+                else:
+                    await self.refresh(db)
+            except Exception:
+                logger.exception("Problem index refresh failed")
+
+    def _ids(self, bucket_key: Tuple[Optional[str], int]) -> np.ndarray:
+        ids = self._id_arrays.get(bucket_key)
+        if ids is None:
+            ids = np.fromiter((p["problemId"] for p in self._buckets[bucket_key]), dtype=np.int64)
+            self._id_arrays[bucket_key] = ids
+        return ids
+
+    def sample(self, keys: List[str], tier: int, k: int = 10, spread: int = 3, exclude: Optional[SolvedSet] = None) -> List[dict]:
+        # Uniform sample over every problem tagged with one of `keys` within
+        # tier +-spread, without concatenating the buckets: pick positions in
+        # the virtual concatenation and map them back with a prefix sum.
+        # Problems in `exclude` are masked out over the whole pool at once.
+        bucket_keys = [
+            (key, level)
+            for key in set(keys)
+            for level in range(tier - spread, tier + spread + 1)
+            if self._buckets.get((key, level))
+        ]
+        if not bucket_keys:
+            return []
+        buckets = [self._buckets[bucket_key] for bucket_key in bucket_keys]
+        ends = list(accumulate(len(bucket) for bucket in buckets))
+        if exclude is None:
+            picks = random.sample(range(ends[-1]), min(k, ends[-1]))
+        else:
+            candidates = np.concatenate([self._ids(bucket_key) for bucket_key in bucket_keys])
+            positions = np.flatnonzero(~exclude.contains_many(candidates))
+            picks = positions[random.sample(range(len(positions)), min(k, len(positions)))].tolist()
+        result = []
+        for position in picks:
+            i = bisect_right(ends, position)
+            start = ends[i - 1] if i else 0
+            result.append(buckets[i][position - start])
+        return result
+
+
+# FastAPI dependency
+def get_problem_index(request: Request) -> ProblemIndex:
+    return request.app.state.problem_index
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+from fastapi import Request
+from pymongo import ReturnDocument
+
+from src import config
+from src.cache import SingleFlight
+from src.db import Database
+from src.dbstats import untracked_task
+from src.metrics import Counter
+from src.solvedac import SolvedAcClient
+
+logger = logging.getLogger(__name__)
+
+profile_refreshes = Counter("profile_refresh_total", "solved.ac profile refreshes of Info documents", ["mode", "result"])
+
+# Info documents as sent to clients: the refresh timestamp is bookkeeping
+INFO_PROJECTION = {"_id": 0, "profileUpdatedAt": 0}
+
+
+def has_profile(info: Optional[dict]) -> bool:
+    # Info documents created by /user/problem/insert have no solved.ac fields
+    return info is not None and "handle" in info
+
+
+def is_stale(info: dict, ttl: float = config.PROFILE_REFRESH_TTL) -> bool:
+    # Profiles written before refreshes were timestamped count as stale
+    updated_at = info.get("profileUpdatedAt")
+    return updated_at is None or datetime.utcnow() - updated_at > timedelta(seconds=ttl)
+
+
+# Keeps the solved.ac part of Info documents fresh without making /login
+# wait for solved.ac: a cached profile is served as is, and one older than
+# PROFILE_REFRESH_TTL is refreshed by a background task. Concurrent refreshes
+# of one user (a login storm, or a background refresh racing an inline one)
+# share a single solved.ac call and write.
+class ProfileRefresher:
+    def __init__(self):
+        self._flight = SingleFlight()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def refresh(self, db: Database, solvedac: SolvedAcClient, user_id: str, bj_id: str) -> dict:
+        # The updated Info document (INFO_PROJECTION); raises SolvedAcError
+        # or httpx.HTTPError
+        return await self._flight.do(user_id, lambda: self._refresh(db, solvedac, user_id, bj_id))
+
+    async def _refresh(self, db: Database, solvedac: SolvedAcClient, user_id: str, bj_id: str) -> dict:
+        data = await solvedac.user_show(bj_id)
+        return await db.Info.find_one_and_update(
+            {"id": user_id},
+            {"$set": {**data, "profileUpdatedAt": datetime.utcnow()}},
+            INFO_PROJECTION,
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def schedule(self, db: Database, solvedac: SolvedAcClient, user_id: str, bj_id: str):
+        # Fire and forget; a refresh already running for the user covers it
+        if self._flight.in_flight(user_id):
+            return
+        task = untracked_task(self._background, db, solvedac, user_id, bj_id)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _background(self, db: Database, solvedac: SolvedAcClient, user_id: str, bj_id: str):
+        try:
+            await self.refresh(db, solvedac, user_id, bj_id)
+        except Exception:
+            # The stale copy keeps being served; the next login retries
+            profile_refreshes.inc(labels=("background", "error"))
+            logger.warning("Background profile refresh failed for %s", user_id, exc_info=True)
+        else:
+            profile_refreshes.inc(labels=("background", "ok"))
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# FastAPI dependency
+def get_profiles(request: Request) -> ProfileRefresher:
+    return request.app.state.profiles
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime
+from typing import Dict
+
+from pymongo import ASCENDING, UpdateOne
+
+from src import schema, timer_store
+from src.db import Database, connect
+
+# Pre-aggregated study time per user and period. One document per
+# (period, key, id), e.g. ("month", "2024-01", "alice"), so a group
+# leaderboard for one period is a single range scan on the unique
+# (period, key, id) index declared in src/schema.py.
+PERIODS = ("day", "week", "month")
+
+BATCH_SIZE = 1000
+
+
+def period_keys(date: str) -> Dict[str, str]:
+    # `date` is the YYYY-MM-DD string the client sends to /start and /stop
+    # (InvalidDate otherwise). The day key is kept verbatim so rollups match
+    # exactly what was stored.
+    timer_store.check_date(date)
+    year, week, _ = datetime.strptime(date, "%Y-%m-%d").isocalendar()
+    return {"day": date, "week": f"{year}-W{week:02d}", "month": date[:7]}
+
+
+async def record_duration(db: Database, user_id: str, date: str, previous: int, duration: int):
+    # /stop overwrites the day's duration, so roll up the difference
+    delta = int(duration) - int(previous or 0)
+    if delta == 0:
+        return
+    await db.StudyRollup.bulk_write(
+        [
+            UpdateOne({"period": period, "key": key, "id": user_id}, {"$inc": {"duration": delta}}, upsert=True)
+            for period, key in period_keys(date).items()
+        ],
+        ordered=False,
+    )
+
+
+async def backfill(db: Database) -> int:
+    # Rebuild every rollup from the timer buckets (migrating any legacy
+    # `dates` arrays first). Totals are written with $set, so re-running it is
+    # safe. Buckets are walked in id order so only one user's totals are held
+    # in memory at a time.
+    await schema.ensure_indexes(db)
+    await timer_store.migrate_all(db)
+    written = 0
+    user_id, totals = None, {}
+
+    async def flush():
+        nonlocal written
+        ops = [
+            UpdateOne({"period": period, "key": key, "id": user_id}, {"$set": {"duration": total}}, upsert=True)
+            for (period, key), total in totals.items()
+        ]
+        for i in range(0, len(ops), BATCH_SIZE):
+            await db.StudyRollup.bulk_write(ops[i:i + BATCH_SIZE], ordered=False)
+        written += len(ops)
+
+    async for bucket in db.TimerBucket.find({}, {"_id": 0, "id": 1, "days": 1}).sort("id", ASCENDING):
+        if bucket.get("id") != user_id:
+            await flush()
+            user_id, totals = bucket.get("id"), {}
+        for date, duration in (bucket.get("days") or {}).items():
+            # Days written before dates were validated may be nested junk
+            if not timer_store.DATE_PATTERN.fullmatch(date) or isinstance(duration, dict):
+                continue
+            for period, key in period_keys(date).items():
+                totals[(period, key)] = totals.get((period, key), 0) + int(duration)
+    await flush()
+    return written
+
+
+async def _main():
+    db = connect()
+    try:
+        written = await backfill(db)
+        print(f"Backfilled {written} rollup documents")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # python -m src.rollup
+    asyncio.run(_main())
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import sys
+from datetime import datetime
+from typing import Dict, List
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from src import config
+from src.db import Database, connect
+
+logger = logging.getLogger(__name__)
+
+# Every index the app relies on, per collection. create_indexes is a no-op
+# for indexes that already exist with the same spec, so this is safe to run
+# on every startup.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "User": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+    ],
+    "Info": [
+        IndexModel([("id", ASCENDING)], name="id"),
+    ],
+    "Group": [
+        IndexModel([("group_name", ASCENDING)], unique=True, name="group_name_unique"),
+    ],
+    "Timer": [
+        # Also serves plain {"id": ...} lookups through its prefix
+        IndexModel([("id", ASCENDING), ("dates.date", ASCENDING)], name="id_dates_date"),
+    ],
+    "TimerBucket": [
+        IndexModel([("id", ASCENDING), ("month", ASCENDING)], unique=True, name="id_month"),
+    ],
+    "StudyRollup": [
+        IndexModel([("period", ASCENDING), ("key", ASCENDING), ("id", ASCENDING)], unique=True, name="period_key_id"),
+    ],
+    "Tip": [
+        IndexModel([("problemId", ASCENDING), ("version", ASCENDING)], unique=True, name="problemId_version"),
+    ],
+    "Problems": [
+        IndexModel([("problemId", ASCENDING)], unique=True, name="problemId_unique"),
+        IndexModel([("key", ASCENDING), ("level", ASCENDING)], name="key_level"),
+        # Incremental refresh of the in-memory problem index
+        IndexModel([("updatedAt", ASCENDING)], name="updatedAt"),
+    ],
+    "PresenceEvent": [
+        # Events only need to outlive the change stream that delivers them
+        IndexModel([("createdAt", ASCENDING)], expireAfterSeconds=config.BROADCAST_EVENT_TTL, name="createdAt_ttl"),
+    ],
+}
+
+# Representative query shapes used by the routers; verify() explains each
+# one and reports those the planner answers with a collection scan.
+QUERIES = [
+    ("User", {"id": "sample"}),
+    ("Info", {"id": "sample"}),
+    ("Info", {"id": {"$in": ["sample"]}}),
+    ("Group", {"group_name": "sample"}),
+    ("Group", {"group_name": {"$gt": "", "$regex": "^sample"}}),
+    ("Timer", {"id": "sample"}),
+    ("Timer", {"id": {"$in": ["sample"]}}),
+    ("Timer", {"id": "sample", "dates.date": "2024-01-01"}),
+    ("TimerBucket", {"id": {"$in": ["sample"]}, "month": "2024-01"}),
+    ("StudyRollup", {"period": "month", "key": "2024-01", "id": {"$in": ["sample"]}}),
+    ("Problems", {"problemId": 1000}),
+    ("Tip", {"problemId": 1000, "version": "sample"}),
+    ("Problems", {"$and": [{"level": {"$gte": 1, "$lte": 7}}, {"key": {"$in": ["dp"]}}]}),
+    ("Problems", {"updatedAt": {"$gte": datetime(2024, 1, 1)}}),
+]
+
+
+async def ensure_indexes(db: Database) -> List[str]:
+    # Returns the indexes that could not be built (e.g. a unique index over
+    # data that already holds duplicates) instead of failing startup.
+    # Connection errors (Mongo unreachable) are raised.
+    failed = []
+    for name, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db.db[name].create_indexes([index])
+            except OperationFailure as e:
+                index_name = index.document["name"]
+                logger.error("Could not create index %s.%s: %s", name, index_name, e)
+                failed.append(f"{name}.{index_name}")
+    return failed
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+async def verify(db: Database) -> List[str]:
+    uncovered = []
+    for name, query in QUERIES:
+        explain = await db.db[name].find(query).explain()
+        if "COLLSCAN" in _stages(explain["queryPlanner"]["winningPlan"]):
+            uncovered.append(f"{name} {query}")
+    for query in uncovered:
+        logger.warning("Query not covered by an index: %s", query)
+    return uncovered
+
+
+async def _main(verify_only: bool):
+    db = connect()
+    try:
+        if not verify_only:
+            failed = await ensure_indexes(db)
+            print(f"Indexes ensured ({len(failed)} failed)")
+            for index in failed:
+                print(f"  failed: {index}")
+        uncovered = await verify(db)
+        print(f"{len(QUERIES) - len(uncovered)}/{len(QUERIES)} queries use an index")
+        for query in uncovered:
+            print(f"  COLLSCAN: {query}")
+    finally:
+        db.close()
+    return 1 if uncovered else 0
+
+
+if __name__ == "__main__":
+    # python -m src.schema [--verify-only]
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main("--verify-only" in sys.argv[1:])))
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from src import config
+from src.metrics import Gauge, Histogram
+
+# Password hashing context
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=config.BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a small dedicated thread pool keeps hashing off
+# the event loop without letting a login burst take every core. Created on
+# first use and dropped by shutdown(), so a later lifespan in the same
+# process (tests, the bench harness) gets a fresh pool.
+_executor: Optional[ThreadPoolExecutor] = None
+
+bcrypt_rounds = Gauge("password_bcrypt_rounds", "bcrypt cost factor used for new password hashes")
+bcrypt_rounds.set(config.BCRYPT_ROUNDS)
+password_workers = Gauge("password_executor_workers", "Size of the password hashing thread pool")
+password_workers.set(config.PASSWORD_HASH_WORKERS)
+password_pending = Gauge("password_executor_pending", "Password hash/verify calls queued or running")
+password_seconds = Histogram("password_hash_seconds", "Time spent hashing or verifying a password, including queueing", ["op"])
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+async def _run(op: str, fn, *args):
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    password_pending.inc()
+    try:
+        return await loop.run_in_executor(_get_executor(), fn, *args)
+    finally:
+        password_pending.dec()
+        password_seconds.observe(time.perf_counter() - started, (op,))
+
+
+async def hash_password(password: str) -> str:
+    return await _run("hash", pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run("verify", pwd_context.verify, password, hashed)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,39 @@
+from typing import Any, Type
+
+import orjson
+from bson import Decimal128, ObjectId, Timestamp
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+# orjson handles dict/list/str/int/float/bool/None and datetime natively (in
+# Rust); this is only called for the BSON types it doesn't know.
+def default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Timestamp):
+        return value.as_datetime()
+    if isinstance(value, Decimal128):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+
+# Default response class of the app. Handlers on hot paths return it directly
+# with documents read from our own collections, which skips FastAPI's
+# jsonable_encoder pass and the response_model re-validation; their
+# response_model is then only used for the OpenAPI schema.
+class MongoJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def projection(model: Type[BaseModel]) -> dict:
+    # Fetch exactly the fields a response model exposes (and never _id)
+    return {"_id": 0, **{field: 1 for field in model.model_fields}}
+
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Iterable, Optional, Set
+
+import numpy as np
+from bson import Binary
+from fastapi import Request
+
+from src import config
+from src.cache import SingleFlight, TTLCache
+from src.db import Database
+from src.dbstats import untracked_task
+from src.solvedac import SolvedAcClient
+
+logger = logging.getLogger(__name__)
+
+
+# Bitmap over problem ids (one bit per id, ~4.5KB for the whole catalog) of
+# problems a user has solved or already saved. Saved ids are user input, so
+# ids outside 0..SOLVED_MAX_PROBLEM_ID are dropped rather than sizing the
+# bitmap after them.
+class SolvedSet:
+    def __init__(self, problem_ids: Iterable = ()):
+        self._bits = np.zeros(0, dtype=np.uint8)
+        self.add_many(problem_ids)
+
+    def add_many(self, problem_ids: Iterable):
+        ids = np.fromiter(_problem_ids(problem_ids), dtype=np.int64)
+        if not len(ids):
+            return
+        size = int(ids.max() >> 3) + 1
+        if size > len(self._bits):
+            self._bits = np.concatenate([self._bits, np.zeros(size - len(self._bits), dtype=np.uint8)])
+        np.bitwise_or.at(self._bits, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+
+    def add(self, problem_id):
+        self.add_many((problem_id,))
+
+    def update(self, other: "SolvedSet"):
+        if len(other._bits) > len(self._bits):
+            self._bits = np.concatenate([self._bits, np.zeros(len(other._bits) - len(self._bits), dtype=np.uint8)])
+        self._bits[:len(other._bits)] |= other._bits
+
+    def tobytes(self) -> bytes:
+        return self._bits.tobytes()
+
+    @classmethod
+    def frombytes(cls, data: bytes) -> "SolvedSet":
+        solved = cls()
+        solved._bits = np.frombuffer(data, dtype=np.uint8).copy()
+        return solved
+
+    def contains_many(self, problem_ids: np.ndarray) -> np.ndarray:
+        mask = np.zeros(len(problem_ids), dtype=bool)
+        in_range = (problem_ids >= 0) & ((problem_ids >> 3) < len(self._bits))
+        ids = problem_ids[in_range]
+        mask[in_range] = (self._bits[ids >> 3] >> (ids & 7)) & 1
+        return mask
+
+    def __contains__(self, problem_id: int) -> bool:
+        return bool(self.contains_many(np.array([problem_id], dtype=np.int64))[0])
+
+    def __len__(self):
+        return int(np.unpackbits(self._bits).sum())
+
+    @property
+    def nbytes(self) -> int:
+        return self._bits.nbytes
+
+
+def _count(value) -> Optional[int]:
+    # solvedCount as stored on Info profiles; None when unknown
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _problem_ids(values: Iterable) -> Iterable[int]:
+    # Saved lists store problem numbers as strings
+    for value in values:
+        try:
+            problem_id = int(value)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= problem_id <= config.SOLVED_MAX_PROBLEM_ID:
+            yield problem_id
+
+
+# Per-user SolvedSets with LRU/TTL eviction. A set is built from the user's
+# saved `problems`/`todo_problems` plus their solved.ac solves, which are
+# persisted per handle in SolvedProblems so a cache miss (TTL, restart,
+# another worker) costs two Mongo reads rather than up to SOLVED_MAX_PAGES
+# solved.ac searches.
+#
+# The persisted copy is refetched from solved.ac only when the handle's
+# solvedCount on its Info profile (kept fresh by /login) no longer matches,
+# and in the background; only a handle never fetched before is waited on,
+# for at most SOLVED_FILL_TIMEOUT seconds, so its first recommendation
+# already excludes its solves.
+class SolvedCache:
+    def __init__(self, maxsize: int = config.SOLVED_CACHE_SIZE, ttl: float = config.SOLVED_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._flight = SingleFlight()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def get(self, db: Database, solvedac: SolvedAcClient, user_id: str) -> SolvedSet:
+        solved = self._cache.get(user_id)
+        if solved is not None:
+            return solved
+        return await self._flight.do(user_id, lambda: self._build(db, solvedac, user_id))
+
+    async def _build(self, db: Database, solvedac: SolvedAcClient, user_id: str) -> SolvedSet:
+        info = await db.Info.find_one(
+            {"id": user_id}, {"_id": 0, "bj_id": 1, "solvedCount": 1, "problems": 1, "todo_problems": 1}
+        ) or {}
+        solved = SolvedSet([*info.get("problems", []), *info.get("todo_problems", [])])
+        handle = info.get("bj_id")
+        if handle:
+            stored = await db.SolvedProblems.find_one({"_id": handle}, {"bits": 1, "count": 1})
+            if stored is not None:
+                solved.update(SolvedSet.frombytes(stored["bits"]))
+            if stored is None or _count(info.get("solvedCount")) not in (None, stored.get("count")):
+                fill = self._start_fill(db, solvedac, handle, solved)
+                if stored is None:
+                    # Cold: wait a little so the first answer is right; the
+                    # fill carries on (and is persisted) if it takes longer
+                    try:
+                        await asyncio.wait_for(asyncio.shield(fill), config.SOLVED_FILL_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        pass
+        self._cache.set(user_id, solved)
+        return solved
+
+    def _start_fill(self, db: Database, solvedac: SolvedAcClient, handle: str, solved: SolvedSet) -> asyncio.Task:
+        task = untracked_task(self._fill_from_solvedac, db, solvedac, handle, solved)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _fill_from_solvedac(self, db: Database, solvedac: SolvedAcClient, handle: str, solved: SolvedSet):
+        # Concurrent fills of one handle (several users, several misses)
+        # share one walk over the pages
+        try:
+            fetched, _ = await self._flight.do(("fill", handle), lambda: self._fetch(db, solvedac, handle))
+        except Exception:
+            logger.exception("Could not load solved problems of %s", handle)
+            return
+        solved.update(fetched)
+
+    async def _fetch(self, db: Database, solvedac: SolvedAcClient, handle: str):
+        fetched, count = SolvedSet(), 0
+        for page in range(1, config.SOLVED_MAX_PAGES + 1):
+            data = await solvedac.search_problems(f"s@{handle}", page)
+            items = data.get("items", [])
+            count = data.get("count", 0)
+            fetched.add_many(item["problemId"] for item in items)
+            if not items or page * 50 >= count:
+                break
+        await db.SolvedProblems.update_one(
+            {"_id": handle},
+            {"$set": {"bits": Binary(fetched.tobytes()), "count": count, "updatedAt": datetime.utcnow()}},
+            upsert=True,
+        )
+        return fetched, count
+
+    def add(self, user_id: str, problem_id):
+        solved = self._cache.get(user_id)
+        if solved is not None:
+            solved.add(problem_id)
+
+    def invalidate(self, user_id: str):
+        self._cache.pop(user_id)
+
+
+# FastAPI dependency
+def get_solved_cache(request: Request) -> SolvedCache:
+    return request.app.state.solved_cache
@@ -0,0 +1,96 @@
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import Request
+
+from src import config
+from src.cache import SingleFlight, TTLCache
+from src.metrics import Histogram
+
+solvedac_seconds = Histogram("solvedac_request_seconds", "solved.ac API call latency (cache misses only)", ["path", "status"])
+
+
+class SolvedAcError(Exception):
+    def __init__(self, status_code: int, detail: str = "External API request failed"):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+# One keep-alive connection pool to solved.ac per worker, with a short TTL
+# cache in front of it. Identical lookups that arrive while a request is
+# already in flight wait for that request instead of issuing their own.
+# Returned dicts are shared with the cache, so callers must not mutate them.
+class SolvedAcClient:
+    def __init__(
+        self,
+        base_url: str = config.SOLVEDAC_BASE_URL,
+        timeout: float = config.SOLVEDAC_TIMEOUT,
+        connect_timeout: float = config.SOLVEDAC_CONNECT_TIMEOUT,
+        max_connections: int = config.SOLVEDAC_MAX_CONNECTIONS,
+        cache_ttl: float = config.SOLVEDAC_CACHE_TTL,
+        cache_size: int = config.SOLVEDAC_CACHE_SIZE,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={"Accept": "application/json"},
+            transport=transport,
+        )
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._flight = SingleFlight()
+
+    async def _get(self, key: tuple, path: str, params: Dict[str, Any], cache: bool = True) -> Any:
+        if cache:
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+
+        async def fetch():
+            started = time.perf_counter()
+            try:
+                response = await self._client.get(path, params=params)
+            except httpx.HTTPError:
+                solvedac_seconds.observe(time.perf_counter() - started, (path, "error"))
+                raise
+            solvedac_seconds.observe(time.perf_counter() - started, (path, str(response.status_code)))
+            if response.status_code != 200:
+                raise SolvedAcError(response.status_code)
+            data = response.json()
+            if cache:
+                self._cache.set(key, data)
+            return data
+
+        return await self._flight.do(key, fetch)
+
+    async def user_show(self, handle: str) -> Dict[str, Any]:
+        return await self._get(("user", handle), "/user/show", {"handle": handle})
+
+    async def user_top_100(self, handle: str) -> Dict[str, Any]:
+        return await self._get(("top_100", handle), "/user/top_100", {"handle": handle})
+
+    async def problem_show(self, problem_id) -> Dict[str, Any]:
+        return await self._get(("problem", str(problem_id)), "/problem/show", {"problemId": problem_id})
+
+    async def search_problems(self, query: str, page: int = 1) -> Dict[str, Any]:
+        # Bulk catalog pages are only read once by the ingester; don't cache them
+        return await self._get(
+            ("search", query, page),
+            "/search/problem",
+            {"query": query, "page": page, "sort": "id", "direction": "asc"},
+            cache=False,
+        )
+
+    def invalidate_user(self, handle: str):
+        self._cache.pop(("user", handle))
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+# FastAPI dependency
+def get_solvedac(request: Request) -> SolvedAcClient:
+    return request.app.state.solvedac
@@ -0,0 +1,157 @@
+import asyncio
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from src import schema
+from src.db import Database, connect
+
+# Study durations live in one TimerBucket document per user per month:
+#
+#   {"id": "alice", "month": "2024-01", "days": {"2024-01-18": 3600, ...}}
+#
+# so a document never holds more than 31 entries however long the user has
+# been active. The Timer document only keeps the user's state (isStudy,
+# recent, ...). Users created before buckets existed still carry a `dates`
+# array; they are moved over the first time /start or /stop touches them
+# (or all at once with `python -m src.timer_store`), and reads fall back to
+# the legacy array until then.
+
+
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class InvalidDate(ValueError):
+    pass
+
+
+def check_date(date: str) -> str:
+    # Dates become Mongo field paths (days.<date>), so anything but a real
+    # YYYY-MM-DD day ('.' nesting, a leading '$', empty segments) is refused
+    # before a path is built. main.py turns InvalidDate into a 400.
+    if not isinstance(date, str) or not DATE_PATTERN.fullmatch(date):
+        raise InvalidDate(f"Invalid date {date!r}, expected YYYY-MM-DD.")
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        raise InvalidDate(f"Invalid date {date!r}, expected YYYY-MM-DD.")
+    return date
+
+
+def month_of(date: str) -> str:
+    return check_date(date)[:7]
+
+
+async def migrate_user(db: Database, user_id: str) -> int:
+    # Copy the legacy `dates` array into buckets, then drop it. $max makes it
+    # idempotent and safe against a concurrent /stop writing the same day.
+    timer_doc = await db.Timer.find_one({"id": user_id}, {"_id": 0, "dates": 1})
+    days: Dict[str, int] = {}
+    for entry in (timer_doc or {}).get("dates") or []:
+        # Malformed legacy dates can't be bucket keys; they are dropped
+        if entry.get("date") and DATE_PATTERN.fullmatch(str(entry["date"])):
+            days[entry["date"]] = days.get(entry["date"], 0) + int(entry.get("duration", 0))
+    if days:
+        ops = [
+            UpdateOne({"id": user_id, "month": month_of(date)}, {"$max": {f"days.{date}": duration}}, upsert=True)
+            for date, duration in days.items()
+        ]
+        await db.TimerBucket.bulk_write(ops, ordered=False)
+    if timer_doc is not None:
+        await db.Timer.update_one({"id": user_id}, {"$set": {"bucketed": True}, "$unset": {"dates": ""}})
+    return len(days)
+
+
+async def ensure_migrated(db: Database, timer_doc: Optional[dict], user_id: str):
+    if timer_doc is not None and not timer_doc.get("bucketed"):
+        await migrate_user(db, user_id)
+
+
+async def open_day(db: Database, user_id: str, date: str) -> int:
+    # Create the day's entry with 0 if it doesn't exist yet and return it
+    check_date(date)
+    bucket = await db.TimerBucket.find_one_and_update(
+        {"id": user_id, "month": month_of(date)},
+        {"$max": {f"days.{date}": 0}},
+        projection={"_id": 0, f"days.{date}": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return bucket["days"][date]
+
+
+async def set_day(db: Database, user_id: str, date: str, duration: int) -> Optional[int]:
+    # Overwrite an existing day's duration; returns the previous value, or
+    # None when the user never started a timer on that day.
+    check_date(date)
+    bucket = await db.TimerBucket.find_one_and_update(
+        {"id": user_id, "month": month_of(date), f"days.{date}": {"$exists": True}},
+        {"$set": {f"days.{date}": duration}},
+        projection={"_id": 0, f"days.{date}": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if bucket is None:
+        return None
+    return bucket["days"][date]
+
+
+async def get_day(db: Database, user_id: str, date: str) -> Optional[int]:
+    check_date(date)
+    bucket = await db.TimerBucket.find_one(
+        {"id": user_id, "month": month_of(date), f"days.{date}": {"$exists": True}},
+        {"_id": 0, f"days.{date}": 1},
+    )
+    if bucket is not None:
+        return bucket["days"][date]
+    # Compatibility read for users that haven't been migrated yet
+    legacy = await db.Timer.find_one(
+        {"id": user_id, "bucketed": {"$ne": True}, "dates.date": date},
+        {"_id": 0, "dates": {"$elemMatch": {"date": date}}},
+    )
+    if legacy and legacy.get("dates"):
+        return int(legacy["dates"][0].get("duration", 0))
+    return None
+
+
+async def get_days(db: Database, user_ids: Iterable[str], date: str) -> Dict[str, int]:
+    # Durations of many users for one day: one query on the buckets plus one
+    # on the legacy arrays of users that haven't been migrated yet.
+    check_date(date)
+    user_ids = list(user_ids)
+    durations: Dict[str, int] = {}
+    async for bucket in db.TimerBucket.find(
+        {"id": {"$in": user_ids}, "month": month_of(date), f"days.{date}": {"$exists": True}},
+        {"_id": 0, "id": 1, f"days.{date}": 1},
+    ):
+        durations[bucket["id"]] = bucket["days"][date]
+    async for legacy in db.Timer.find(
+        {"id": {"$in": [u for u in user_ids if u not in durations]}, "bucketed": {"$ne": True}, "dates.date": date},
+        {"_id": 0, "id": 1, "dates": {"$elemMatch": {"date": date}}},
+    ):
+        durations[legacy["id"]] = int(legacy["dates"][0].get("duration", 0))
+    return durations
+
+
+async def migrate_all(db: Database) -> int:
+    migrated = 0
+    async for timer_doc in db.Timer.find({"bucketed": {"$ne": True}}, {"_id": 0, "id": 1}):
+        await migrate_user(db, timer_doc["id"])
+        migrated += 1
+    return migrated
+
+
+async def _main():
+    db = connect()
+    try:
+        await schema.ensure_indexes(db)
+        migrated = await migrate_all(db)
+        print(f"Migrated {migrated} timer documents to monthly buckets")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # python -m src.timer_store
+    asyncio.run(_main())
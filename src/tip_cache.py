@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from fastapi import Request
+from pymongo.errors import DuplicateKeyError
+
+from src import config
+from src.cache import SingleFlight, TTLCache
+from src.db import Database
+
+
+# Two-tier cache for generated tips: an in-process LRU in front of the Tip
+# collection, keyed by (problemId, version) where the version changes with
+# the model or prompt. Concurrent misses for the same problem share a single
+# generation.
+class TipCache:
+    def __init__(self, maxsize: int = config.TIP_CACHE_SIZE, ttl: float = config.TIP_CACHE_TTL):
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._flight = SingleFlight()
+
+    async def lookup(self, db: Database, problem_id: int, version: str):
+        key = (problem_id, version)
+        content = self._memory.get(key)
+        if content is None:
+            stored = await db.Tip.find_one({"problemId": problem_id, "version": version}, {"_id": 0, "content": 1})
+            if stored is not None:
+                content = stored["content"]
+                self._memory.set(key, content)
+        return content
+
+    async def store(self, db: Database, problem_id: int, version: str, content: str):
+        self._memory.set((problem_id, version), content)
+        try:
+            await db.Tip.insert_one({
+                "problemId": problem_id,
+                "version": version,
+                "content": content,
+                "createdAt": datetime.utcnow(),
+            })
+        except DuplicateKeyError:
+            # Another worker stored the same tip first
+            pass
+
+    async def get_or_generate(
+        self,
+        db: Database,
+        problem_id: int,
+        version: str,
+        generate: Callable[[], Awaitable[str]],
+    ) -> str:
+        content = self._memory.get((problem_id, version))
+        if content is not None:
+            return content
+
+        async def load_or_generate():
+            content = await self.lookup(db, problem_id, version)
+            if content is None:
+                content = await generate()
+                await self.store(db, problem_id, version, content)
+            return content
+
+        return await self._flight.do((problem_id, version), load_or_generate)
+
+
+# FastAPI dependency
+def get_tip_cache(request: Request) -> TipCache:
+    return request.app.state.tip_cache
@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import types
+from pathlib import Path
+
+import pytest
+
+# Settings read at import time; the lifespan is never run, so no real Mongo
+# or OpenAI client is created. The app and mongomock (requirements-dev.txt)
+# are imported by the fixtures, so test modules can importorskip them.
+os.environ.setdefault("LLM_BACKEND", "stub")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Collection methods that issue one command each, by command name
+COMMANDS = {
+    "find": "find",
+    "find_one": "find",
+    "aggregate": "aggregate",
+    "count_documents": "aggregate",
+    "insert_one": "insert",
+    "insert_many": "insert",
+    "update_one": "update",
+    "update_many": "update",
+    "bulk_write": "update",
+    "replace_one": "update",
+    "delete_one": "delete",
+    "delete_many": "delete",
+    "find_one_and_update": "findAndModify",
+    "find_one_and_delete": "findAndModify",
+}
+
+
+# mongomock never talks to a server, so pymongo's command monitoring never
+# fires. This reports each collection call to the app's listener as the
+# command a real server would have received, so dbstats counts it the same.
+class CountingCollection:
+    def __init__(self, collection, listener):
+        self._collection = collection
+        self._listener = listener
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        command = COMMANDS.get(name)
+        if command is None:
+            return attribute
+
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            result = attribute(*args, **kwargs)
+            duration_micros = int((time.perf_counter() - started) * 1e6)
+            self._listener.succeeded(types.SimpleNamespace(command_name=command, duration_micros=duration_micros, reply={"ok": 1}))
+            return result
+
+        return call
+
+
+def counting_database():
+    from mongomock_motor import AsyncMongoMockClient
+
+    from src.db import Database
+    from src.dbstats import CommandStatsListener
+
+    db = Database(AsyncMongoMockClient())
+    listener = CommandStatsListener()
+    for name, value in list(vars(db).items()):
+        if name not in ("client", "db"):
+            setattr(db, name, CountingCollection(value, listener))
+    return db
+
+
+@pytest.fixture
+def db():
+    return counting_database()
+
+
+@pytest.fixture
+def client(db):
+    # The app with the lifespan's components set up by hand around the
+    # mongomock database; use inside asyncio.run
+    import httpx
+
+    import main
+    from src.broadcast import MemoryBroadcast
+    from src.leaderboard import LeaderboardStore
+    from src.llm import LLMExecutor, StubBackend
+    from src.presence import PresenceRegistry
+    from src.problem_index import ProblemIndex
+    from src.profile import ProfileRefresher
+    from src.solved import SolvedCache
+    from src.tip_cache import TipCache
+
+    state = main.app.state
+    state.db = db
+    state.broadcast = MemoryBroadcast()
+    state.presence = PresenceRegistry()
+    state.leaderboards = LeaderboardStore()
+    state.profiles = ProfileRefresher()
+    state.solved_cache = SolvedCache()
+    state.tip_cache = TipCache()
+    state.problem_index = ProblemIndex()
+    state.llm = LLMExecutor(StubBackend(latency=0, tokens=3, token_delay=0))
+    return lambda: httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+
+@pytest.fixture
+def mongomock_timer_pipeline(monkeypatch):
+    # mongomock has no $lookup with let/pipeline; the same single
+    # aggregation with a localField lookup issues the same one command
+    # (it doesn't filter on the month, so seed a single month)
+    import routers.timer
+
+    original = routers.timer.group_timer_pipeline
+
+    def pipeline(member_ids, date):
+        stages = original(member_ids, date)
+        stages[1] = {"$lookup": {"from": "TimerBucket", "localField": "id", "foreignField": "id", "as": "bucket"}}
+        stages[2]["$project"]["bucket"] = {"$arrayElemAt": [f"$bucket.days.{date}", 0]}
+        return stages
+
+    monkeypatch.setattr(routers.timer, "group_timer_pipeline", pipeline)
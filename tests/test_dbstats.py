@@ -0,0 +1,150 @@
+import asyncio
+import struct
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("motor")
+
+import bson
+
+from src import dbstats
+from src.cache import SingleFlight
+from src.db import connect
+
+OP_REPLY, OP_QUERY, OP_MSG = 1, 2004, 2013
+
+HELLO = {
+    "ok": 1,
+    "helloOk": True,
+    "isWritablePrimary": True,
+    "ismaster": True,
+    "minWireVersion": 0,
+    "maxWireVersion": 17,
+    "maxBsonObjectSize": 16 * 1024 * 1024,
+    "maxMessageSizeBytes": 48000000,
+    "maxWriteBatchSize": 100000,
+}
+
+
+# Just enough of a mongod for Motor/pymongo to hand real commands (and so
+# real command monitoring events) to src.db's listeners: handshakes are
+# answered, every find returns `documents`, anything else is acknowledged.
+class FakeMongo:
+    def __init__(self, documents):
+        self.documents = documents
+        self.commands = []
+        self._server = None
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"mongodb://{host}:{port}/?directConnection=true"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _reply(self, command: dict) -> dict:
+        name = next(iter(command))
+        if name.lower() in ("hello", "ismaster"):
+            return {**HELLO, "localTime": datetime.utcnow()}
+        self.commands.append(name)
+        if name == "find":
+            return {"ok": 1, "cursor": {"id": bson.Int64(0), "ns": f"{command['$db']}.{command['find']}", "firstBatch": self.documents}}
+        return {"ok": 1}
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                length, request_id, _, opcode = struct.unpack("<iiii", await reader.readexactly(16))
+                body = await reader.readexactly(length - 16)
+                if opcode == OP_QUERY:
+                    # Legacy handshake: flags, namespace, skip, limit, query
+                    namespace_end = body.index(b"\0", 4)
+                    command = bson.decode(body[namespace_end + 9:][:struct.unpack("<i", body[namespace_end + 9:][:4])[0]])
+                    reply = bson.encode(self._reply(command))
+                    payload = struct.pack("<iqii", 0, 0, 0, 1) + reply
+                    opcode = OP_REPLY
+                else:
+                    # flagBits, then a kind 0 section holding the command
+                    size = struct.unpack("<i", body[5:9])[0]
+                    command = bson.decode(body[5:5 + size])
+                    payload = struct.pack("<IB", 0, 0) + bson.encode(self._reply(command))
+                writer.write(struct.pack("<iiii", 16 + len(payload), 0, request_id, opcode) + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def run(session):
+    async def go():
+        server = FakeMongo([{"id": "a"}])
+        db = connect(await server.start())
+        try:
+            return await session(db)
+        finally:
+            db.close()
+            await server.stop()
+
+    return asyncio.run(go())
+
+
+def test_commands_are_billed_to_the_awaiting_scope():
+    async def session(db):
+        await db.Info.find_one({"id": "a"})  # no scope: not counted anywhere
+        with dbstats.tracking() as outer:
+            await db.Info.find_one({"id": "a"})
+            with dbstats.tracking() as inner:
+                await db.Info.find_one({"id": "a"})
+                await db.Info.update_one({"id": "a"}, {"$set": {"n": 1}})
+        return outer, inner
+
+    outer, inner = run(session)
+    assert (inner.commands, inner.by_command) == (2, {"find": 1, "update": 1})
+    assert (outer.commands, outer.by_command) == (3, {"find": 2, "update": 1})
+    assert outer.seconds > 0
+
+
+def test_concurrent_requests_are_billed_separately():
+    async def one_request(db, n):
+        with dbstats.tracking() as stats:
+            for _ in range(n):
+                await db.Info.find_one({"id": "a"})
+        return stats.commands
+
+    async def session(db):
+        return await asyncio.gather(*(one_request(db, n) for n in (1, 2, 3)))
+
+    assert run(session) == [1, 2, 3]
+
+
+def test_untracked_work_is_not_billed_to_the_request():
+    async def session(db):
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def shared():
+            await release.wait()
+            return await db.Info.find_one({"id": "a"})
+
+        with dbstats.tracking() as first:
+            # The first caller starts the flight and gives up before it
+            # queries; the second caller is the one still waiting on it
+            started = asyncio.ensure_future(flight.do("a", shared))
+            await asyncio.sleep(0)
+        with dbstats.tracking() as second:
+            waiting = asyncio.ensure_future(flight.do("a", shared))
+            await asyncio.sleep(0)
+            release.set()
+            await waiting
+            await started
+            background = dbstats.untracked_task(db.Info.find_one, {"id": "a"})
+            await background
+        return first, second
+
+    first, second = run(session)
+    assert first.commands == 0
+    assert second.commands == 0
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from src import ingest
+
+QUERY = "tier:b5..r1"
+
+
+# solved.ac's problem search over `total` problems, failing once on `fail_page`
+class FakeSolvedAc:
+    def __init__(self, total: int, fail_page: int = None):
+        self.total = total
+        self.fail_page = fail_page
+        self.pages = []
+
+    async def search_problems(self, query, page):
+        self.pages.append(page)
+        if page == self.fail_page:
+            self.fail_page = None
+            raise RuntimeError("solved.ac is down")
+        first = (page - 1) * ingest.PAGE_SIZE + 1
+        ids = range(first, min(first + ingest.PAGE_SIZE, self.total + 1))
+        return {"count": self.total, "items": [{"problemId": i, "titleKo": str(i), "level": 1, "tags": []} for i in ids]}
+
+
+def test_interrupted_run_resumes_after_the_last_written_page(db):
+    solvedac = FakeSolvedAc(total=4 * ingest.PAGE_SIZE, fail_page=3)
+
+    async def go():
+        with pytest.raises(RuntimeError):
+            await ingest.ingest_query(db, solvedac, QUERY, batch_size=ingest.PAGE_SIZE)
+        interrupted = await db.IngestCheckpoint.find_one({"_id": QUERY})
+        solvedac.pages.clear()
+        written = await ingest.ingest_query(db, solvedac, QUERY, batch_size=ingest.PAGE_SIZE)
+        return interrupted, written, await db.IngestCheckpoint.find_one({"_id": QUERY}), await db.Problems.count_documents({})
+
+    interrupted, written, checkpoint, stored = asyncio.run(go())
+    assert (interrupted["page"], interrupted["done"]) == (2, False)
+    assert solvedac.pages == [3, 4]
+    assert written == 2 * ingest.PAGE_SIZE
+    assert (checkpoint["page"], checkpoint["done"]) == (4, True)
+    assert stored == 4 * ingest.PAGE_SIZE
+
+
+def test_finished_run_rereads_its_last_page(db):
+    solvedac = FakeSolvedAc(total=2 * ingest.PAGE_SIZE + 1)
+
+    async def go():
+        await ingest.ingest_query(db, solvedac, QUERY)
+        solvedac.pages.clear()
+        solvedac.total += 1
+        await ingest.ingest_query(db, solvedac, QUERY)
+        return await db.Problems.count_documents({})
+
+    assert asyncio.run(go()) == 2 * ingest.PAGE_SIZE + 2
+    assert solvedac.pages == [3]
+
+
+def test_empty_query_checkpoints_page_zero_and_restarts_at_one(db):
+    solvedac = FakeSolvedAc(total=0)
+
+    async def go():
+        await ingest.ingest_query(db, solvedac, QUERY)
+        checkpoint = await db.IngestCheckpoint.find_one({"_id": QUERY})
+        await ingest.ingest_query(db, solvedac, QUERY)
+        return checkpoint
+
+    checkpoint = asyncio.run(go())
+    assert (checkpoint["page"], checkpoint["done"]) == (0, True)
+    assert solvedac.pages == [1, 1]
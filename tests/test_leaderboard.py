@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+import main
+from src import security
+from src.leaderboard import BUILD_ATTEMPTS, Leaderboard, LeaderboardStore
+
+DATE = "2024-01-18"
+
+
+def test_leaderboard_orders_by_duration_then_membership():
+    board = Leaderboard()
+    for user_id, duration in [("a", 10), ("b", 30), ("c", 10), ("d", 0)]:
+        board.add(user_id, duration)
+    board.add("a", 99)  # already a member: ignored
+    assert board.page() == [("b", 30), ("a", 10), ("c", 10), ("d", 0)]
+
+    board.increment("d", 15)
+    board.increment("missing", 5)
+    assert board.page() == [("b", 30), ("d", 15), ("a", 10), ("c", 10)]
+    assert board.rank("d") == 2
+    assert board.rank("missing") is None
+
+    board.remove("b")
+    assert "b" not in board
+    assert len(board) == 3
+    assert board.page(1, 1) == [("a", 10)]
+
+
+def test_leaderboard_around():
+    board = Leaderboard()
+    for i in range(10):
+        board.add(f"u{i}", 100 - i)
+    assert board.around("u5", 2) == (6, [("u3", 97), ("u4", 96), ("u5", 95), ("u6", 94), ("u7", 93)], 4)
+    assert board.around("u0", 2) == (1, [("u0", 100), ("u1", 99), ("u2", 98)], 1)
+    assert board.around("missing", 2) == (None, [], 0)
+
+
+def reading(store, changes):
+    # Replaces the store's rollup read; every read records a /stop for "a"
+    # part way through while `changes` says so
+    reads = []
+
+    async def read(db, group_name, period, key):
+        reads.append(key)
+        board = Leaderboard()
+        board.add("a", len(reads))
+        if changes(len(reads)):
+            await store.record("a", DATE, 5)
+        return board
+
+    store._read = read
+    return reads
+
+
+def test_build_rereads_a_board_changed_while_reading():
+    store = LeaderboardStore()
+    reads = reading(store, lambda n: n == 1)
+
+    async def go():
+        first = await store.get(None, "g", "day", DATE)
+        second = await store.get(None, "g", "day", DATE)
+        return first, second
+
+    first, second = asyncio.run(go())
+    assert len(reads) == 2
+    assert first is second
+    assert first.page() == [("a", 2)]
+
+
+def test_build_serves_a_board_that_keeps_changing_uncached():
+    store = LeaderboardStore()
+    reads = reading(store, lambda n: True)
+
+    async def go():
+        await store.get(None, "g", "day", DATE)
+        await store.get(None, "g", "day", DATE)
+
+    asyncio.run(go())
+    assert len(reads) == 2 * BUILD_ATTEMPTS
+
+
+class FakeSolvedAc:
+    async def user_show(self, handle):
+        return {"handle": handle, "solvedCount": 0, "tier": 0}
+
+
+def test_signup_joins_cached_default_boards(client, db, monkeypatch):
+    # A new user lands in the "default" group's boards that are already
+    # cached, so their study time counts without waiting for a rebuild
+    monkeypatch.setattr(main.app.state, "solvedac", FakeSolvedAc(), raising=False)
+
+    async def go():
+        await db.Group.insert_one({"group_name": "default", "members": ["a"]})
+        await db.User.insert_one({"id": "a", "bj_id": "bj_a", "nickname": "a", "password": security.pwd_context.hash("pw")})
+        await db.Info.insert_one({"id": "a", "nickname": "a", "bj_id": "bj_a", "solvedCount": 1, "tier": 1})
+        async with client() as http:
+            board = await http.post("/rank/individual_day", json={"group_name": "default", "date": DATE})
+            assert [member["id"] for member in board.json()] == ["a"]
+
+            signup = await http.post("/signup", json={"id": "b", "bj_id": "bj_b", "nickname": "b", "password": "pw"})
+            assert signup.json()["success"]
+            assert (await http.post("/start", json={"id": "b", "date": DATE})).status_code == 200
+            assert (await http.post("/stop", json={"id": "b", "date": DATE, "duration": 120})).status_code == 200
+
+            board = await http.post("/rank/individual_day", json={"group_name": "default", "date": DATE})
+            member = await http.post("/rank/member", json={"group_name": "default", "key": DATE, "id": "b"})
+        return board.json(), member
+
+    board, member = asyncio.run(go())
+    assert [(row["id"], row["duration"]) for row in board] == [("b", 120), ("a", 0)]
+    assert member.status_code == 200
+    assert member.json()["rank"] == 1
+
+
+def test_rank_rows_match_the_declared_model(client, db):
+    # /rank/individual_month's rows bypass response validation, so the
+    # published model has to admit what describe() fills in
+    from routers.rank import MemberDurationModel
+
+    async def go():
+        await db.Group.insert_one({"group_name": "g", "members": ["a", "ghost"]})
+        await db.Info.insert_one({"id": "a", "nickname": "a", "bj_id": "bj_a", "solvedCount": 3, "tier": 7})
+        async with client() as http:
+            return (await http.post("/rank/individual_month", json={"group_name": "g", "date": DATE[:7]})).json()
+
+    rows = asyncio.run(go())
+    assert [MemberDurationModel(**row).model_dump() for row in rows] == rows
+    assert rows[1]["tier"] == "Unknown"
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from src import dbstats
+from src.leaderboard import LeaderboardStore
+
+# Upper bounds on the Mongo commands one request may issue, independent of
+# group size, so a query creeping back into a per-member loop fails here.
+
+MEMBERS = [f"user{i}" for i in range(30)]
+DATE = "2024-01-18"
+
+
+async def seed(db):
+    await db.Group.insert_one({"group_name": "g", "members": MEMBERS})
+    await db.Info.insert_many([
+        {"id": m, "nickname": m, "bj_id": "bj_" + m, "solvedCount": i, "rank": i, "rating": i, "tier": 5}
+        for i, m in enumerate(MEMBERS)
+    ])
+    await db.Timer.insert_many([{"id": m, "nickname": m, "isStudy": False, "recent": None, "bucketed": True} for m in MEMBERS])
+    await db.TimerBucket.insert_many([{"id": m, "month": DATE[:7], "days": {DATE: i * 60}} for i, m in enumerate(MEMBERS)])
+    await db.StudyRollup.insert_many(
+        [{"period": "day", "key": DATE, "id": m, "duration": i * 60} for i, m in enumerate(MEMBERS)]
+        + [{"period": "month", "key": DATE[:7], "id": m, "duration": i * 60} for i, m in enumerate(MEMBERS)]
+    )
+
+
+def request(client, db, method, path, body, limit):
+    async def go():
+        await seed(db)
+        async with client() as http:
+            with dbstats.expect_max_commands(limit) as stats:
+                response = await http.request(method, path, json=body)
+        return response, stats
+
+    return asyncio.run(go())
+
+
+def test_group_member(client, db):
+    # Group, then one $in over Info
+    response, _ = request(client, db, "POST", "/group/member", {"group_name": "g"}, 2)
+    assert response.status_code == 200
+    assert [m["id"] for m in response.json()["members"]] == MEMBERS
+
+
+def test_timer_group(client, db, mongomock_timer_pipeline):
+    # Group, then one aggregation over Timer and the buckets
+    response, _ = request(client, db, "POST", "/timer/group", {"group_name": "g", "date": DATE}, 2)
+    assert response.status_code == 200
+    assert len(response.json()["members"]) == len(MEMBERS)
+
+
+@pytest.mark.parametrize("path, date", [("/rank/individual_day", DATE), ("/rank/individual_month", DATE[:7])])
+def test_rank(client, db, path, date):
+    # One $in over Info; the cold board is built by a shared flight, which
+    # no single request is billed for (see test_leaderboard_build)
+    response, _ = request(client, db, "POST", path, {"group_name": "g", "date": date}, 1)
+    assert response.status_code == 200
+    assert len(response.json()) == len(MEMBERS)
+
+
+def test_leaderboard_build(db):
+    # Group, then StudyRollup
+    async def go():
+        await seed(db)
+        with dbstats.expect_max_commands(2):
+            return await LeaderboardStore()._build(db, "g", "day", DATE)
+
+    assert len(asyncio.run(go())) == len(MEMBERS)
+
+
+def test_budget_catches_per_member_queries(db):
+    async def go():
+        with dbstats.expect_max_commands(2):
+            for member in MEMBERS:
+                await db.Info.find_one({"id": member})
+
+    with pytest.raises(AssertionError, match="30 Mongo commands"):
+        asyncio.run(go())
@@ -0,0 +1,44 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src import config
+from src.solved import SolvedSet
+
+
+def test_out_of_range_ids_are_dropped():
+    # Saved ids are user input: one huge id must not size the bitmap
+    solved = SolvedSet(["1000", "80000000000", str(10 ** 30), "-5", "abc", None])
+    assert 1000 in solved
+    assert 80000000000 not in solved
+    assert len(solved) == 1
+    assert solved.nbytes <= config.SOLVED_MAX_PROBLEM_ID // 8 + 1
+
+
+def test_max_problem_id_is_kept():
+    solved = SolvedSet()
+    solved.add(config.SOLVED_MAX_PROBLEM_ID)
+    solved.add(config.SOLVED_MAX_PROBLEM_ID + 1)
+    assert config.SOLVED_MAX_PROBLEM_ID in solved
+    assert len(solved) == 1
+
+
+def test_membership_and_merge():
+    solved = SolvedSet(["1000", 1001, "1001"])
+    assert 1000 in solved and 1001 in solved
+    assert 1002 not in solved
+    assert len(solved) == 2
+
+    other = SolvedSet([5, 30000])
+    solved.update(other)
+    assert len(solved) == 4
+    assert list(solved.contains_many(np.array([5, 6, 30000, 40000, -1], dtype=np.int64))) == [True, False, True, False, False]
+
+
+def test_bytes_round_trip():
+    solved = SolvedSet([1, 8, 1000, 29999])
+    restored = SolvedSet.frombytes(solved.tobytes())
+    assert restored.tobytes() == solved.tobytes()
+    restored.add(2)  # a copy, not a view over the stored bytes
+    assert len(restored) == 5
+    assert len(solved) == 4
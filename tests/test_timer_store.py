@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from src import timer_store
+
+
+def test_migrate_user_buckets_legacy_dates(db):
+    async def go():
+        await db.Timer.insert_one({"id": "a", "dates": [
+            {"date": "2024-01-18", "duration": 60},
+            {"date": "2024-01-18", "duration": 30},  # duplicate entries add up
+            {"date": "2024-02-01", "duration": 10},
+            {"date": "2024-2-1", "duration": 99},  # malformed: dropped
+            {"date": "2024-02-01.x", "duration": 99},
+        ]})
+        # A /stop that already wrote a larger value to the bucket wins
+        await db.TimerBucket.insert_one({"id": "a", "month": "2024-02", "days": {"2024-02-01": 50}})
+        migrated = await timer_store.migrate_user(db, "a")
+        again = await timer_store.migrate_user(db, "a")
+        buckets = {
+            doc["month"]: doc["days"]
+            async for doc in db.TimerBucket.find({"id": "a"}, {"_id": 0, "month": 1, "days": 1})
+        }
+        return migrated, again, buckets, await db.Timer.find_one({"id": "a"}, {"_id": 0})
+
+    migrated, again, buckets, timer = asyncio.run(go())
+    assert migrated == 2
+    assert again == 0
+    assert buckets == {"2024-01": {"2024-01-18": 90}, "2024-02": {"2024-02-01": 50}}
+    assert timer == {"id": "a", "bucketed": True}
+
+
+@pytest.mark.parametrize("date", ["2024-1-18", "2024-13-01", "2024-01-18.x", "$where", ""])
+def test_invalid_dates_are_rejected(date):
+    with pytest.raises(timer_store.InvalidDate):
+        timer_store.check_date(date)
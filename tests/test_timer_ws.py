@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+import main
+from src.broadcast import MemoryBroadcast
+
+DATE = "2024-01-18"
+
+
+async def seed(db):
+    await db.Group.insert_one({"group_name": "g", "members": ["a", "b"]})
+    await db.Timer.insert_many([
+        {"id": "a", "nickname": "a", "isStudy": False, "recent": None, "bucketed": True},
+        {"id": "b", "nickname": "b", "isStudy": False, "recent": None, "bucketed": True},
+    ])
+    await db.TimerBucket.insert_one({"id": "a", "month": DATE[:7], "days": {DATE: 60}})
+
+
+# One /timer/ws connection driven straight through the ASGI app, so it
+# shares the event loop (and the broadcast's queues) with the HTTP client
+class WebSocketSession:
+    def __init__(self, query: str):
+        self._incoming = asyncio.Queue()
+        self._outgoing = asyncio.Queue()
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "server": ("test", 80),
+            "client": ("test", 1),
+            "root_path": "",
+            "path": "/timer/ws",
+            "query_string": query.encode(),
+            "headers": [],
+            "subprotocols": [],
+        }
+        self.task = asyncio.create_task(main.app(scope, self._incoming.get, self._outgoing.put))
+
+    async def connect(self) -> dict:
+        await self._incoming.put({"type": "websocket.connect"})
+        return await self.message()
+
+    async def message(self) -> dict:
+        return await asyncio.wait_for(self._outgoing.get(), 1)
+
+    async def receive_json(self) -> dict:
+        message = await self.message()
+        assert message["type"] == "websocket.send"
+        return json.loads(message["text"])
+
+    async def disconnect(self):
+        await self._incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 1)
+
+
+def run(client, db, session):
+    async def go():
+        await seed(db)
+        async with client() as http:
+            return await session(http)
+
+    return asyncio.run(go())
+
+
+def test_snapshot_then_events(client, db, mongomock_timer_pipeline):
+    async def session(http):
+        ws = WebSocketSession(f"group_name=g&date={DATE}")
+        assert (await ws.connect())["type"] == "websocket.accept"
+        snapshot = await ws.receive_json()
+
+        await http.post("/start", json={"id": "b", "date": DATE})
+        started = await ws.receive_json()
+        await http.post("/stop", json={"id": "b", "date": DATE, "duration": 30})
+        stopped = await ws.receive_json()
+        await ws.disconnect()
+        return snapshot, started, stopped
+
+    snapshot, started, stopped = run(client, db, session)
+    assert snapshot["type"] == "snapshot"
+    assert [(m["id"], m["dates"][0]["duration"]) for m in snapshot["members"]] == [("a", 60)]
+    assert snapshot["missing"] == 1
+    assert started == {"type": "start", "id": "b", "isStudy": True, "date": DATE, "duration": 0}
+    assert stopped["type"] == "stop"
+    assert (stopped["id"], stopped["isStudy"], stopped["duration"]) == ("b", False, 30)
+
+
+def test_disconnect_unsubscribes(client, db, mongomock_timer_pipeline):
+    broadcast = main.app.state.broadcast
+
+    async def session(http):
+        ws = WebSocketSession(f"group_name=g&date={DATE}")
+        await ws.connect()
+        await ws.receive_json()
+        subscribed = set(broadcast._subscribers)
+        await ws.disconnect()
+        return subscribed, set(broadcast._subscribers)
+
+    subscribed, remaining = run(client, db, session)
+    assert subscribed == {"timer:a", "timer:b"}
+    assert remaining == set()
+
+
+@pytest.mark.parametrize("query, reason", [
+    (f"group_name=missing&date={DATE}", "Group not found"),
+    ("group_name=g&date=2024-1-8", "2024-1-8"),
+])
+def test_rejected_connections_are_closed(client, db, query, reason):
+    async def session(http):
+        ws = WebSocketSession(query)
+        message = await ws.connect()
+        await asyncio.wait_for(ws.task, 1)
+        return message
+
+    message = run(client, db, session)
+    assert message["type"] == "websocket.close"
+    assert message["code"] == 1008
+    assert reason in message["reason"]
+
+
+def test_slow_subscriber_loses_oldest_events():
+    broadcast = MemoryBroadcast(queue_size=2)
+
+    async def go():
+        async with broadcast.subscribe(["c"]) as events:
+            for i in range(3):
+                await broadcast.publish("c", {"n": i})
+            return [events.get_nowait()["n"] for _ in range(events.qsize())]
+
+    assert asyncio.run(go()) == [1, 2]